@@ -5,9 +5,26 @@ from github import Github, GithubException
 import base64
 import os
 from cryptography.fernet import Fernet
-import anthropic
 import time
-from openai import OpenAI
+import asyncio
+import fnmatch
+import uuid
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import OrderedDict
+from repo_store import RepoStore
+from diff_engine import diff_texts
+from code_validation import validate_cached, strip_fences, local_module_names
+from snapshot import load_snapshot, git_blob_sha
+from prefetch import Prefetcher
+from tracing import span, traced, set_action, profile_call
+from llm_async import MODELS, run_batch
+from llm_policy import LatencyStats, hedged_complete, histogram_labels, model_summary
+from github_ops import commit_files, StaleBaseError
+from windowed_editor import WindowedBuffer, WINDOW_THRESHOLD_BYTES, WINDOW_LINES
+from sandbox_slots import lease_slot, record_run, release_slot, expire_slots, slot_path, slot_page, SLOT_CAP
+from save_queue import SaveJournal, SaveFlusher, COALESCE_SECONDS
+from path_index import PathIndex
  
 
 st.set_page_config(page_title="GitHub Repository Manager", layout="wide")
@@ -40,39 +57,416 @@ def load_token():
     return None
 
 # GitHub operations
+HEAD_POLL_SECONDS = 30
+MAX_FOREIGN_COMMITS = 10
+SAVE_STATUS_SECONDS = 5
+SANDBOX_URL = "https://streamcoder.ploomberapp.io"
+COMMIT_CACHE_SIZE = 16
+
+@st.cache_resource
+def get_repo_store():
+    return RepoStore()
+
+@st.cache_resource
+def get_validation_pool():
+    return ProcessPoolExecutor(max_workers=2)
+
+@st.cache_resource
+def get_prefetch_pool():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='prefetch')
+
+def get_prefetcher():
+    if 'prefetcher' not in st.session_state:
+        st.session_state.prefetcher = Prefetcher(get_prefetch_pool(), get_repo_store())
+    return st.session_state.prefetcher
+
+@st.cache_resource
+def get_latency_stats():
+    return LatencyStats()
+
+@st.cache_resource
+def get_save_flusher():
+    # One flusher thread per process; the journal is shared on disk, so processes claim groups instead of racing
+    flusher = SaveFlusher(get_save_journal(), st.secrets["GITHUB_TOKEN"])
+    flusher.start()
+    return flusher
+
+@st.cache_resource(max_entries=8)
+def get_path_index(tree_sha, _paths):
+    # Trees are immutable, so every session browsing the same tree shares one index
+    return PathIndex(_paths)
+
+@st.cache_resource
+def get_save_journal():
+    return SaveJournal()
+
+def get_session_id():
+    return st.session_state.setdefault('session_id', uuid.uuid4().hex)
+
+def get_repo(g, repo_name):
+    repos = st.session_state.setdefault('repo_objects', {})
+    if repo_name not in repos:
+        repos[repo_name] = g.get_user().get_repo(repo_name)
+    return repos[repo_name]
+
+def get_branch_cache(repo_name, branch):
+    caches = st.session_state.setdefault('branch_cache', {})
+    if (repo_name, branch) not in caches:
+        caches[(repo_name, branch)] = {'ref': None, 'head': None, 'own_commits': set()}
+    return caches[(repo_name, branch)]
+
+def get_commit_cache():
+    # Path -> blob SHA maps of recently visited commits, so switching back to a ref costs nothing
+    if 'commit_entries' not in st.session_state:
+        st.session_state.commit_entries = OrderedDict()
+    return st.session_state.commit_entries
+
+def remember_commit_entries(commit_sha, entries):
+    cache = get_commit_cache()
+    cache[commit_sha] = entries
+    cache.move_to_end(commit_sha)
+    while len(cache) > COMMIT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+def note_own_commit(repo_name, result, branch=None):
+    # Commits made from this session must not be reported back as upstream changes
+    repo = get_repo(st.session_state.g, repo_name)
+    get_branch_cache(repo_name, branch or repo.default_branch)['own_commits'].add(result['commit'].sha)
+
+@traced("github.poll_head")
+def poll_branch_head(g, repo_name, branch=None):
+    # One conditional request on the branch ref; a 304 costs no rate limit and means nothing moved
+    repo = get_repo(g, repo_name)
+    branch = branch or repo.default_branch
+    cache = get_branch_cache(repo_name, branch)
+    if cache['ref'] is None:
+        cache['ref'] = repo.get_git_ref(f"heads/{branch}")
+    elif not cache['ref'].update():
+        return []
+    old_head, new_head = cache['head'], cache['ref'].object.sha
+    cache['head'] = new_head
+    if old_head is None or old_head == new_head:
+        return []
+    old_tree = get_commit_cache().get(old_head)
+    try:
+        comparison = repo.compare(old_head, new_head)
+        files, commits = comparison.files, comparison.commits
+    except GithubException:
+        files, commits = None, None
+    if files is None or len(files) >= 300:
+        # Old head is gone (force push) or the compare API truncated the file list: refetch the listing
+        return list(old_tree or [])
+    # Derive the new head's path -> blob SHA map from the old one; blobs themselves never go stale
+    tree = dict(old_tree) if old_tree is not None else None
+    changed = []
+    for f in files:
+        changed.append(f.filename)
+        if f.previous_filename:
+            changed.append(f.previous_filename)
+            if tree is not None:
+                tree.pop(f.previous_filename, None)
+        if tree is not None:
+            if f.status == "removed":
+                tree.pop(f.filename, None)
+            else:
+                tree[f.filename] = f.sha
+    if tree is not None:
+        remember_commit_entries(new_head, tree)
+    foreign = [c for c in commits if c.sha not in cache['own_commits']]
+    if not foreign:
+        return []
+    if len(foreign) < len(commits) and len(foreign) <= MAX_FOREIGN_COMMITS:
+        # Mixed with our own saves: only paths the other commits touched are upstream changes.
+        # This costs one request per foreign commit, so long ranges keep the whole compare list.
+        changed = []
+        for c in foreign:
+            for f in c.files:
+                changed.append(f.filename)
+                if f.previous_filename:
+                    changed.append(f.previous_filename)
+    return changed
+
 @st.fragment
+@traced("github.list_repos")
 def list_repos(g):
     user = g.get_user()
     repos = user.get_repos()
     return [""] + [repo.name for repo in repos]
 
+@traced("github.list_refs")
+def list_refs(g, repo_name):
+    refs = st.session_state.setdefault('repo_refs', {})
+    if repo_name not in refs:
+        repo = get_repo(g, repo_name)
+        branches = [branch.name for branch in repo.get_branches()]
+        branches.sort(key=lambda name: name != repo.default_branch)
+        refs[repo_name] = {'branches': branches, 'tags': [tag.name for tag in repo.get_tags()]}
+    return refs[repo_name]
+
+def is_branch(g, repo_name, ref):
+    return ref is None or ref in list_refs(g, repo_name)['branches']
+
+def current_branch():
+    # Branch that saves and sandbox runs go to; tags and commits fall back to the default branch
+    ref = st.session_state.get('selected_ref')
+    if is_branch(st.session_state.g, st.session_state.selected_repo, ref):
+        return ref
+    return None
+
+def resolve_commit(g, repo_name, ref=None):
+    # Branch heads are kept current by the poller; tags and SHAs are resolved once per session
+    if is_branch(g, repo_name, ref):
+        cache = get_branch_cache(repo_name, ref or get_repo(g, repo_name).default_branch)
+        if cache['head'] is None:
+            poll_branch_head(g, repo_name, ref)
+        return cache['head']
+    commits = st.session_state.setdefault('ref_commits', {})
+    if (repo_name, ref) not in commits:
+        commits[(repo_name, ref)] = get_repo(g, repo_name).get_commit(ref).sha
+    return commits[(repo_name, ref)]
+
+@traced("github.tree")
+def get_tree_entries(g, repo_name, ref=None):
+    # Path -> blob SHA for a ref; commit and tree objects come from the local store when possible
+    commit_sha = resolve_commit(g, repo_name, ref)
+    cache = get_commit_cache()
+    if commit_sha in cache:
+        cache.move_to_end(commit_sha)
+        return cache[commit_sha]
+    repo = get_repo(g, repo_name)
+    store = get_repo_store()
+    tree_sha = store.get_commit_tree(commit_sha)
+    if tree_sha is None:
+        tree_sha = repo.get_git_commit(commit_sha).tree.sha
+        store.put_commit_tree(commit_sha, tree_sha)
+    entries = store.get_tree(tree_sha)
+    sizes = store.get_tree_sizes(tree_sha)
+    if entries is None or sizes is None:
+        tree = repo.get_git_tree(tree_sha, recursive=True)
+        entries, sizes = {}, {}
+        if tree.raw_data.get('truncated'):
+            # Very large repos: the recursive tree is capped, walk the contents API instead
+            contents = repo.get_contents("", ref=commit_sha)
+            while contents:
+                file_content = contents.pop(0)
+                if file_content.type == "dir":
+                    contents.extend(repo.get_contents(file_content.path, ref=commit_sha))
+                else:
+                    entries[file_content.path] = file_content.sha
+                    sizes[file_content.sha] = file_content.size
+        else:
+            for element in tree.tree:
+                if element.type == "blob":
+                    entries[element.path] = element.sha
+                    sizes[element.sha] = element.size
+        store.put_tree(tree_sha, entries)
+        store.put_tree_sizes(tree_sha, sizes)
+    get_blob_sizes().update(sizes)
+    remember_commit_entries(commit_sha, entries)
+    return entries
+
+def get_blob_sizes():
+    # Blob SHA -> size for every tree listed in this session; blobs only known from a compare have no size
+    return st.session_state.setdefault('blob_sizes', {})
+
 @st.fragment
-def list_files(g, repo_name):
+@traced("github.list_files")
+def list_files(g, repo_name, ref=None):
     if not repo_name:
         return []
-    repo = g.get_user().get_repo(repo_name)
-    contents = repo.get_contents("")
-    files = []
-    while contents:
-        file_content = contents.pop(0)
-        if file_content.type == "dir":
-            contents.extend(repo.get_contents(file_content.path))
-        else:
-            files.append(file_content.path)
-    return files
+    return list(get_tree_entries(g, repo_name, ref))
 
 @st.fragment
-def get_file_content(g, repo_name, file_path):
-    repo = g.get_user().get_repo(repo_name)
-    content = repo.get_contents(file_path)
-    return base64.b64decode(content.content).decode()
+@traced("github.get_file")
+def get_file_content(g, repo_name, file_path, ref=None):
+    return read_file(g, repo_name, file_path, ref)
+
+def read_file(g, repo_name, file_path, ref=None):
+    sha = get_tree_entries(g, repo_name, ref)[file_path]
+    store = get_repo_store()
+    text = store.get_blob_text(sha)
+    if text is None:
+        blob = get_repo(g, repo_name).get_git_blob(sha)
+        data = base64.b64decode(blob.content)
+        store.put_blob(sha, data)
+        text = data.decode()
+    return text
+
+@traced("github.snapshot")
+def load_repo_snapshot(g, repo_name, ref=None):
+    # One tarball download warms the blob store with every text file of the commit
+    commit_sha = resolve_commit(g, repo_name, ref)
+    snapshots = st.session_state.setdefault('snapshot_stats', {})
+    if commit_sha not in snapshots:
+        store = get_repo_store()
+        snapshot = store.get_snapshot(commit_sha)
+        if snapshot is None:
+            url = get_repo(g, repo_name).get_archive_link("tarball", commit_sha)
+            # Reads go through the tree listing and the blob store, so only the stats are kept
+            snapshot = {'stats': load_snapshot(url, store)}
+            store.put_snapshot(commit_sha, snapshot)
+        snapshots[commit_sha] = snapshot['stats']
+    return snapshots[commit_sha]
+
+def snapshot_summary(stats):
+    summary = f"Snapshot: {stats['files']} files, {format_bytes(stats['bytes'])} loaded in {stats['seconds']:.1f}s, largest file buffered {format_bytes(stats.get('peak_buffered', 0))}"
+    skipped = stats['skipped_binary'] + stats['skipped_large']
+    if skipped:
+        summary += f", {skipped} binary or oversized files skipped"
+    if stats['truncated']:
+        summary += ", size limit reached"
+    return summary
+
+@traced("github.create_branch")
+def create_branch(g, repo_name, branch, from_ref=None):
+    repo = get_repo(g, repo_name)
+    repo.create_git_ref(f"refs/heads/{branch}", resolve_commit(g, repo_name, from_ref))
+    list_refs(g, repo_name)['branches'].append(branch)
+
+def format_bytes(n):
+    for unit in ["B", "KB", "MB"]:
+        if n < 1024:
+            return f"{n:.0f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+@traced("github.base_blob")
+def get_base_content():
+    # Committed version of the open file, by the blob SHA it was loaded from
+    sha = st.session_state.file_sha
+    store = get_repo_store()
+    text = store.get_blob_text(sha)
+    if text is None:
+        blob = get_repo(st.session_state.g, st.session_state.selected_repo).get_git_blob(sha)
+        data = base64.b64decode(blob.content)
+        store.put_blob(sha, data)
+        text = data.decode()
+    return text
+
+def assemble_buffer():
+    # Pending window edits are joined into the full text only when something needs all of it
+    windowed = st.session_state.get('windowed')
+    if windowed is not None and windowed.source is st.session_state.file_content and windowed.pending:
+        st.session_state.file_content = windowed.text()
+    return st.session_state.file_content
+
+def get_windowed_buffer():
+    # Large files are edited through a window; any wholesale change of file_content starts a fresh buffer
+    content = st.session_state.file_content
+    windowed = st.session_state.get('windowed')
+    if windowed is not None and windowed.source is content:
+        return windowed
+    if len(content.encode()) <= WINDOW_THRESHOLD_BYTES:
+        st.session_state.windowed = None
+        return None
+    st.session_state.windowed = WindowedBuffer(content)
+    st.session_state.window_start = 1
+    return st.session_state.windowed
+
+def window_controls(windowed):
+    def jump_to_symbol():
+        if st.session_state.window_symbol is not None:
+            st.session_state.window_start = max(1, st.session_state.window_symbol[0] + 1 - WINDOW_LINES // 4)
+    st.session_state.window_start = min(st.session_state.get('window_start', 1), max(len(windowed), 1))
+    nav_col1, nav_col2, nav_col3 = st.columns([2, 1, 1], vertical_alignment="bottom")
+    with nav_col1:
+        st.selectbox("Jump to symbol:", windowed.symbols(), index=None, format_func=lambda symbol: f"{symbol[1]} (line {symbol[0] + 1})",
+            key='window_symbol', on_change=jump_to_symbol)
+    with nav_col2:
+        st.number_input("First line:", min_value=1, max_value=max(len(windowed), 1), key='window_start')
+    with nav_col3:
+        window_size = st.number_input("Lines shown:", min_value=50, max_value=5000, value=WINDOW_LINES, step=50, key='window_size')
+    return windowed.window(st.session_state.window_start - 1, window_size)
+
+def render_diff(key):
+    assemble_buffer()
+    context = st.number_input("Context lines", min_value=0, max_value=50, value=3, key=f"{key}_context")
+    diff = diff_texts(st.session_state.file_sha, get_base_content(), st.session_state.file_content, context)
+    if not diff['hunks']:
+        st.caption("No changes against the committed version.")
+        return
+    st.caption(f"+{diff['added']} / -{diff['removed']} lines in {len(diff['hunks'])} hunk(s)")
+    for header, body in diff['hunks']:
+        with st.expander(header, expanded=len(diff['hunks']) <= 5):
+            st.code(body, language='diff')
+
+def get_local_modules():
+    # Names the edited repo can import from itself, recomputed only when the commit changes
+    commit = resolve_commit(st.session_state.g, st.session_state.selected_repo, st.session_state.get('selected_ref'))
+    cached = st.session_state.get('local_modules')
+    if cached is None or cached[0] != commit:
+        entries = get_tree_entries(st.session_state.g, st.session_state.selected_repo, st.session_state.get('selected_ref'))
+        cached = st.session_state.local_modules = (commit, local_module_names(entries))
+    return cached[1]
+
+@traced("validate_code")
+def check_code(file_path):
+    # Rejects code that would not even compile before it costs a commit and a redeploy
+    try:
+        result = validate_cached(get_validation_pool(), st.session_state.file_content, file_path, st.session_state.get('lint_code', False), get_local_modules())
+    except Exception as e:
+        st.warning(f"Code validation could not run: {str(e)}", icon=':material/warning:')
+        return True
+    for warning in result['warnings']:
+        st.warning(warning, icon=':material/warning:')
+    if result['errors']:
+        st.error("Code validation failed:\n\n" + "\n\n".join(result['errors']), icon=':material/sentiment_dissatisfied:')
+        return False
+    if result['fences_stripped']:
+        st.session_state.file_content = result['code']
+        st.info("Removed markdown code fences from the editor content.", icon=':material/content_cut:')
+    return True
+
+@st.fragment(run_every=HEAD_POLL_SECONDS)
+@traced("fragment.watch_head")
+def watch_branch_head():
+    # Reruns on its own timer so upstream pushes surface without any user interaction
+    ref = st.session_state.get('selected_ref')
+    if not is_branch(st.session_state.g, st.session_state.selected_repo, ref):
+        return
+    if st.session_state.get('write_behind_used'):
+        # Commits the background flusher made for this session are our own, not upstream changes
+        get_branch_cache(st.session_state.selected_repo, ref)['own_commits'].update(get_save_journal().commit_shas(get_session_id()))
+    try:
+        changed = poll_branch_head(st.session_state.g, st.session_state.selected_repo, ref)
+    except GithubException:
+        return
+    if st.session_state.selected_file in changed:
+        st.session_state.upstream_changed = True
+    if st.session_state.get('upstream_changed'):
+        entries = get_tree_entries(st.session_state.g, st.session_state.selected_repo, ref)
+        if st.session_state.selected_file not in entries:
+            # Deleted or renamed upstream: there is nothing to reload, and the buffer may be the only copy left
+            st.warning(f"'{st.session_state.selected_file}' was deleted or renamed upstream. The editor keeps your copy.", icon=':material/sync_problem:')
+            return
+        st.warning(f"'{st.session_state.selected_file}' changed upstream since it was loaded.", icon=':material/sync_problem:')
+        if st.button("Reload from repo", key='reload_upstream'):
+            set_action("reload_upstream")
+            st.session_state.file_content = get_file_content(st.session_state.g, st.session_state.selected_repo, st.session_state.selected_file, ref)
+            st.session_state.file_sha = entries[st.session_state.selected_file]
+            st.session_state.upstream_changed = False
+            st.rerun()
+
+@st.fragment(run_every=SAVE_STATUS_SECONDS)
+def save_queue_status():
+    status = get_save_journal().status(get_session_id())
+    for path, saves, error in status['pending']:
+        note = f" - last attempt failed: {error}" if error else ""
+        st.caption(f":material/schedule: {path}: {saves} save(s) pending{note}")
+    for path, saves, error in status['failed']:
+        st.caption(f":material/error: {path}: {saves} save(s) could not be committed and were given up: {error}")
+    if status['flushed']:
+        st.caption(f":material/cloud_done: {status['flushed']} save(s) flushed in {status['commits']} commit(s), "
+                   f"{status['commits_saved']} commit(s) saved by coalescing")
 
 @st.fragment
+@traced("github.update_file")
 def update_file(g, repo_name, file_path, content, commit_message):
     try:
         repo = g.get_user().get_repo(repo_name)
         contents = repo.get_contents(file_path)
-        repo.update_file(contents.path, commit_message, content, contents.sha)
+        result = repo.update_file(contents.path, commit_message, content, contents.sha)
+        note_own_commit(repo_name, result)
         st.success(f"File '{file_path}' updated successfully.", icon=':material/sentiment_satisfied:')
         return True
     except Exception as e:
@@ -80,6 +474,7 @@ def update_file(g, repo_name, file_path, content, commit_message):
         return False
 
 @st.fragment
+@traced("github.create_repo")
 def create_repo(g, repo_name):
     try:
         user = g.get_user()
@@ -89,15 +484,18 @@ def create_repo(g, repo_name):
         st.error(f"Error creating repository: {str(e)}", icon=':material/sentiment_dissatisfied:')
 
 @st.fragment
+@traced("github.delete_repo")
 def delete_repo(g, repo_name):
     try:
         repo = g.get_user().get_repo(repo_name)
         repo.delete()
+        st.session_state.get('repo_objects', {}).pop(repo_name, None)
         st.success(f"Repository '{repo_name}' deleted successfully.", icon=':material/sentiment_satisfied:')
     except Exception as e:
         st.error(f"Error deleting repository: {str(e)}", icon=':material/sentiment_dissatisfied:')
 
 @st.dialog("Create/Delete Repositories")
+@traced("dialog.repo_management")
 def repo_management_dialog():
     repo_action = st.radio("Choose an action:", ["Create Repository", "Delete Repository"])
     repo_name = st.text_input("Repository Name:")
@@ -110,25 +508,30 @@ def repo_management_dialog():
             delete_repo(g, repo_name)
 
 @st.fragment
+@traced("github.create_file")
 def create_file(g, repo_name, file_path, content, commit_message):
     try:
         repo = g.get_user().get_repo(repo_name)
-        repo.create_file(file_path, commit_message, content)
+        result = repo.create_file(file_path, commit_message, content)
+        note_own_commit(repo_name, result)
         st.success(f"File '{file_path}' created successfully in '{repo_name}'.", icon=':material/sentiment_satisfied:')
     except Exception as e:
         st.error(f"Error creating file: {str(e)}", icon=':material/sentiment_dissatisfied:')
 
 @st.fragment
+@traced("github.delete_file")
 def delete_file(g, repo_name, file_path, commit_message):
     try:
         repo = g.get_user().get_repo(repo_name)
         contents = repo.get_contents(file_path)
-        repo.delete_file(contents.path, commit_message, contents.sha)
+        result = repo.delete_file(contents.path, commit_message, contents.sha)
+        note_own_commit(repo_name, result)
         st.success(f"File '{file_path}' deleted successfully from '{repo_name}'.", icon=':material/sentiment_satisfied:')
     except Exception as e:
         st.error(f"Error deleting file: {str(e)}", icon=':material/sentiment_dissatisfied:')
 
 @st.dialog("Create/Delete Files in Repo")
+@traced("dialog.file_management")
 def file_management_dialog():
     repos = list_repos(st.session_state.g)
     selected_repo = st.selectbox("Choose a repository:", repos)
@@ -146,6 +549,7 @@ def file_management_dialog():
             delete_file(g, selected_repo, file_path, commit_message)
 
 # Authentication function
+@traced("github.auth")
 def github_auth():
     #st.sidebar.title("GitHub Authentication")
 
@@ -167,58 +571,197 @@ def github_auth():
 
 # LLM code generation
 @st.fragment
+@traced("llm.generate")
 def generate_code_with_llm(prompt, app_code):
     selected_llm = st.session_state.get('selected_llm', 'Sonnet-3.5')
-    system_prompt="You are an expert Python programmer. Respond only with clean Python code that addresses the user's request, do not add (!) any of your explanations, do not add (!) any quote characters. You may comment the code using commenting markup. By default output full code unless specified by the user prompt."
-    if selected_llm == 'Sonnet-3.5':
-        anthropic_api_key = st.secrets["ANTHROPIC_API_KEY"]
-
-        if not anthropic_api_key:
-            st.error("Anthropic API key not found in secrets.", icon=':material/sentiment_dissatisfied:')
-            return None
-
-        client = anthropic.Anthropic(api_key=anthropic_api_key)
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20240620",
-            max_tokens=8192,
-            temperature=0,
-            system=system_prompt,
-            messages=[{"role": "user", "content": [{"type": "text", "text": prompt+" "+app_code}]}])
-        return message.content[0].text
-        
-    elif selected_llm == 'GPT-4o':
-        openai_api_key = st.secrets["OPENAI_API_KEY"]
-        if not openai_api_key:
-            st.error("OpenAI API key not found in secrets.")
-            return None
-
-        client = OpenAI(api_key=openai_api_key)
-        completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt + " " + app_code}
-            ]
-        )
-        return completion.choices[0].message.content
+    # Every model with a key can serve as the hedge/fallback for the selected one
+    api_keys = {name: st.secrets.get(model['secret']) for name, model in MODELS.items()}
+    api_keys = {name: key for name, key in api_keys.items() if key}
+    if selected_llm not in api_keys:
+        st.error(f"{MODELS[selected_llm]['secret']} not found in secrets.", icon=':material/sentiment_dissatisfied:')
+        return None
+    try:
+        generated_code, answered_by = asyncio.run(hedged_complete(selected_llm, api_keys, prompt, app_code, get_latency_stats()))
+    except Exception as e:
+        st.error(f"LLM request failed: {str(e)}", icon=':material/sentiment_dissatisfied:')
+        return None
+    if answered_by != selected_llm:
+        st.toast(f"{selected_llm} was slow or failing; this answer came from {answered_by}.", icon=':material/swap_horiz:')
+    return generated_code
+
+@st.dialog("Apply a prompt to many files", width="large")
+@traced("dialog.batch_prompt")
+def batch_prompt_dialog():
+    g = st.session_state.g
+    repo_name, ref = st.session_state.selected_repo, st.session_state.get('selected_ref')
+    pattern = st.text_input("Files to include (glob):", value="*.py", key='batch_glob')
+    matched = fnmatch.filter(get_tree_entries(g, repo_name, ref), pattern)
+    st.caption(f"{len(matched)} file(s) in {repo_name} / {ref or 'default'} match")
+    batch_llm = st.selectbox("Choose LLM:", list(MODELS), key='batch_llm')
+    prompt = st.text_area("Prompt applied to each file:", height=150, key='batch_prompt')
+    concurrency = st.slider("Concurrent requests:", 1, 32, 8, key='batch_concurrency')
+    # Opt-in like in the file selector: the archive can be up to 200 MB
+    bulk_load = st.checkbox("Bulk-load the whole repository in one download first", value=False, key='batch_bulk_load')
+    if st.button("Run batch", disabled=not (matched and prompt)):
+        set_action("run_batch")
+        api_key = st.secrets.get(MODELS[batch_llm]['secret'])
+        if not api_key:
+            st.error(f"No API key configured for {batch_llm}.", icon=':material/sentiment_dissatisfied:')
+            return
+        files, base = {}, {}
+        with st.spinner(f"Loading {len(matched)} file(s)..."):
+            if bulk_load:
+                try:
+                    load_repo_snapshot(g, repo_name, ref)
+                except Exception as e:
+                    st.warning(f"Snapshot download failed, loading files individually: {str(e)}", icon=':material/warning:')
+            entries = get_tree_entries(g, repo_name, ref)
+            for path in matched:
+                try:
+                    files[path] = read_file(g, repo_name, path, ref)
+                    base[path] = entries[path]
+                except UnicodeDecodeError:
+                    continue
+        with st.spinner(f"Applying the prompt to {len(files)} file(s)..."):
+            results, stats = asyncio.run(run_batch(batch_llm, api_key, prompt, files, concurrency))
+        changed = {}
+        for path, result in results.items():
+            if 'content' in result:
+                content = strip_fences(result['content'])[0] if path.endswith('.py') else result['content']
+                if content != files[path]:
+                    changed[path] = content
+        st.session_state.batch_changeset = {
+            'repo': repo_name, 'ref': ref, 'base': base, 'files': changed, 'stats': stats,
+            'errors': {path: result['error'] for path, result in results.items() if 'error' in result},
+        }
+    changeset = st.session_state.get('batch_changeset')
+    if not changeset:
+        return
+    stats = changeset['stats']
+    st.divider()
+    st.caption(f"{stats['files']} file(s) in {stats['seconds']:.0f}s: {stats['files_per_minute']:.1f} files/min, {stats['output_tokens_per_second']:.0f} output tokens/s, {stats['input_tokens']} in / {stats['output_tokens']} out tokens, about ${stats['cost']:.2f}")
+    for path, error in changeset['errors'].items():
+        st.warning(f"{path}: {error}", icon=':material/warning:')
+    if not changeset['files']:
+        st.info("The prompt did not change any file.", icon=':material/info:')
+        return
+    selected = []
+    for path, content in changeset['files'].items():
+        if st.checkbox(f"Include {path}", value=True, key=f"batch_include_{path}"):
+            selected.append(path)
+        base_sha = changeset['base'][path]
+        diff = diff_texts(base_sha, read_file(g, changeset['repo'], path, changeset['ref']), content)
+        with st.expander(f"{path}: +{diff['added']} / -{diff['removed']}"):
+            for header, body in diff['hunks']:
+                st.code(f"{header}\n{body}", language='diff')
+    commit_message = st.text_input("Commit Message:", value=prompt[:72], key='batch_commit_message')
+    branch = current_branch() if changeset['ref'] == st.session_state.get('selected_ref') else None
+    new_branch_name = st.text_input("Commit to a new branch (leave empty to use the current branch):", key='batch_new_branch').strip()
+    commit_col, discard_col = st.columns([1, 1])
+    with discard_col:
+        if st.button("Discard changeset"):
+            del st.session_state.batch_changeset
+            st.rerun()
+    with commit_col:
+        if st.button(f"Commit {len(selected)} file(s) as one commit", disabled=not selected):
+            set_action("commit_batch")
+            try:
+                if new_branch_name:
+                    create_branch(g, changeset['repo'], new_branch_name, changeset['ref'])
+                    branch = new_branch_name
+                if branch is None:
+                    raise ValueError("Tags and commits are read-only; enter a new branch name.")
+                with span("github.commit_files", files=len(selected)):
+                    commit = commit_files(get_repo(g, changeset['repo']), branch, {path: changeset['files'][path] for path in selected}, commit_message,
+                                          base=changeset['base'])
+                note_own_commit(changeset['repo'], {'commit': commit}, branch)
+                open_file = st.session_state.get('selected_file')
+                if changeset['repo'] == st.session_state.get('selected_repo') and open_file in selected:
+                    # The batch read the committed file, so only a buffer without unsaved edits may be replaced
+                    if git_blob_sha(assemble_buffer().encode()) == changeset['base'][open_file]:
+                        content = changeset['files'][open_file]
+                        st.session_state.file_content = content
+                        st.session_state.file_sha = git_blob_sha(content.encode())
+                        get_repo_store().put_blob(st.session_state.file_sha, content.encode(), fetched=False)
+                    else:
+                        # Surfaces the head watcher's "Reload from repo" for the committed version
+                        st.session_state.upstream_changed = True
+                        st.warning(f"'{open_file}' has unsaved edits in the editor, so the batch result was committed but not loaded into it.",
+                                   icon=':material/warning:')
+                st.session_state.selected_ref = branch
+                del st.session_state.batch_changeset
+                st.success(f"Committed {len(selected)} file(s) to '{branch}'.", icon=':material/sentiment_satisfied:')
+            except StaleBaseError as e:
+                st.error(f"Nothing was committed: {str(e)}. Untick these files or run the batch again so upstream edits are not reverted.",
+                         icon=':material/sync_problem:')
+            except Exception as e:
+                st.error(f"Error committing changeset: {str(e)}", icon=':material/sentiment_dissatisfied:')
 
 @st.dialog("Choose file from a repo")
+@traced("dialog.file_selector")
 def file_selector_dialog():
     repos = list_repos(st.session_state.g)
     selected_repo = st.selectbox("Choose a repository:", repos)
     
     files = []
+    selected_ref = None
     if selected_repo:
-        files = list_files(st.session_state.g, selected_repo)
+        refs = list_refs(st.session_state.g, selected_repo)
+        ref_col1, ref_col2 = st.columns([1, 1])
+        with ref_col1:
+            selected_ref = st.selectbox("Branch or tag:", refs['branches'] + refs['tags'])
+        with ref_col2:
+            commit_sha = st.text_input("Or commit SHA:", key='selected_commit_sha').strip()
+        if commit_sha:
+            selected_ref = commit_sha
+        try:
+            files = list_files(st.session_state.g, selected_repo, selected_ref)
+        except GithubException as e:
+            st.error(f"Could not resolve '{selected_ref}': {str(e)}", icon=':material/sentiment_dissatisfied:')
     
-    selected_file = st.selectbox("Select File to Edit:", files)
+    # Only the top matches are sent to the browser; the full listing stays in the server-side index
+    matches = []
+    if files:
+        commit = resolve_commit(st.session_state.g, selected_repo, selected_ref)
+        index = get_path_index(get_repo_store().get_commit_tree(commit) or commit, files)
+        query = st.text_input("Find file:", key='file_query', placeholder="Part of a path, e.g. 'app' or 'src util'")
+        started = time.perf_counter()
+        matches, total = index.search(query)
+        st.caption(f"{total:,} of {len(index):,} files match, showing the top {len(matches)} ({(time.perf_counter() - started) * 1000:.1f} ms)")
+    selected_file = st.selectbox("Select File to Edit:", matches)
+    # Opt-in: the archive download can be up to 200 MB and blocks the dialog while it runs
+    bulk_load = st.checkbox("Bulk-load the whole repository in one download", value=False, key='bulk_load')
+    store_stats = get_repo_store().stats()
+    st.caption(f"Local store: {format_bytes(store_stats['bytes_local'])} served locally, {format_bytes(store_stats['bytes_fetched'])} fetched from GitHub")
+    prefetch_stats = get_prefetcher().stats()
+    if prefetch_stats['opens']:
+        st.caption(f"Prefetch: {prefetch_stats['hit_rate']:.0%} hit rate ({prefetch_stats['hits']}/{prefetch_stats['opens']} opens), {format_bytes(prefetch_stats['bytes_prefetched'])} prefetched, {format_bytes(prefetch_stats['wasted_bytes'])} unused")
+    if files:
+        stats = st.session_state.get('snapshot_stats', {}).get(resolve_commit(st.session_state.g, selected_repo, selected_ref))
+        if stats:
+            st.caption(snapshot_summary(stats))
     
     if st.button("Load File Content"):
+        set_action("load_file")
         if selected_repo and selected_file:
-            content = get_file_content(st.session_state.g, selected_repo, selected_file)
+            if bulk_load:
+                try:
+                    with st.spinner("Downloading repository snapshot..."):
+                        load_repo_snapshot(st.session_state.g, selected_repo, selected_ref)
+                except Exception as e:
+                    st.warning(f"Snapshot download failed, loading files individually: {str(e)}", icon=':material/warning:')
+            content = get_file_content(st.session_state.g, selected_repo, selected_file, selected_ref)
             st.session_state.file_content = content
+            entries = get_tree_entries(st.session_state.g, selected_repo, selected_ref)
+            st.session_state.file_sha = entries[selected_file]
+            # Warm the store with the files most likely to be opened next
+            prefetcher = get_prefetcher()
+            prefetcher.record_open(entries[selected_file])
+            prefetcher.schedule(get_repo(st.session_state.g, selected_repo), entries, get_blob_sizes(), content, selected_file, st.session_state.g.rate_limiting[0])
             st.session_state.selected_repo = selected_repo
+            st.session_state.selected_ref = selected_ref
             st.session_state.selected_file = selected_file
+            st.session_state.upstream_changed = False
             st.rerun()
 #@st.fragment
 def code_editor_and_prompt():
@@ -291,8 +834,39 @@ def code_editor_and_prompt():
            },
       "info": [{"name": "python", "style": {"width": "100px"}}] }
 
-    response_dict = code_editor(st.session_state.file_content,  buttons=custom_btns, options={"wrap": True}, 
-    theme="contrast", height=[30, 50], focus=False, info=info_bar, props={"style": ace_style}, component_props={"style": code_style})
+    windowed = get_windowed_buffer()
+    if windowed is None:
+        response_dict = code_editor(st.session_state.file_content,  buttons=custom_btns, options={"wrap": True}, 
+        theme="contrast", height=[30, 50], focus=False, info=info_bar, props={"style": ace_style}, component_props={"style": code_style})
+    else:
+        # Only the window travels to the browser; "Apply" keeps window edits without committing
+        start, end, window_text = window_controls(windowed)
+        custom_btns.append({
+            "name": "Apply",
+            "feather": "Check",
+            "hasText": True,
+            "commands": ["save-state", ["response", "applied"]],
+            "response": "applied",
+            "style": {"bottom": "calc(50% - 1.5rem)", "right": "0.4rem"}
+        })
+        response_dict = code_editor(window_text, buttons=custom_btns, options={"wrap": True, "firstLineNumber": start + 1},
+            theme="contrast", height=[30, 50], focus=False, info=info_bar, props={"style": ace_style}, component_props={"style": code_style},
+            key=f"windowed_editor_{start}_{end}_{windowed.edits}")
+        if len(response_dict['id']) == 0 or response_dict['id'] == st.session_state.get('windowed_response_id'):
+            # The component keeps returning its last response; it only holds window text, so never act on it twice
+            response_dict = {'id': '', 'type': '', 'text': ''}
+        else:
+            st.session_state.windowed_response_id = response_dict['id']
+            st.session_state.windowed_received = len(response_dict['text'].encode())
+            if response_dict['type'] in ("applied", "saved", "submit"):
+                windowed.apply(start, end, response_dict['text'])
+            if response_dict['type'] == "applied":
+                st.rerun()
+            if response_dict['type'] in ("saved", "submit"):
+                response_dict['text'] = assemble_buffer()
+        st.caption(f"Windowed mode: lines {start + 1}-{end} of {len(windowed)}. Editor payload: {format_bytes(len(window_text.encode()))} sent, "
+            f"{format_bytes(st.session_state.get('windowed_received', 0))} received, full file {format_bytes(len(st.session_state.file_content.encode()))}. "
+            f"{windowed.pending} pending window edit(s); click Apply before moving the window.")
     
     #st.write("Text:"+st.session_state.file_content)
     #t = time.localtime()
@@ -301,26 +875,62 @@ def code_editor_and_prompt():
     if len(response_dict['id']) != 0:
         #st.write("THIS IS THE TRIGGER:"+ response_dict['type']+ "/n "+ response_dict['text'])
         if response_dict['type'] == "submit":
+          set_action("run_sandbox")
           execute_code_sandbox()
         elif response_dict['type'] == "selection":
             # Handle selection type
             pass
         elif response_dict['type'] == "saved":
+            set_action("open_save_dialog")
             st.session_state.file_content=response_dict['text']
             dialog_update()    
 
 @st.dialog("Confirm repo file update")
+@traced("dialog.update")
 def dialog_update():
     st.write(f"**Confirm updating {st.session_state.selected_file}**")
+    render_diff('update_diff')
     commit_message = st.text_input("Commit Message:", key='commit_message_txt') 
+    branch = current_branch()
+    # Tags and commits are read-only, so saving from one always goes to a new branch
+    new_branch = st.checkbox("Save to a new branch", value=branch is None, disabled=branch is None)
+    if new_branch:
+        new_branch_name = st.text_input("New branch name:", key='new_branch_txt').strip()
+    write_behind = st.checkbox(f"Save in the background (saves within {COALESCE_SECONDS}s are combined into one commit)",
+                               key='write_behind', disabled=new_branch)
     save_button = st.button(f"Save Changes to {st.session_state.get('selected_file', 'No file selected')}")
     if save_button:
+        set_action("save_file")
         if all(key in st.session_state for key in ['g', 'selected_repo', 'selected_file', 'file_content']):
+            if st.session_state.selected_file.endswith('.py') and not check_code(st.session_state.selected_file):
+                return
+            if write_behind and not new_branch:
+                # The save is durable once it is in the journal; the flusher commits it later
+                repo = get_repo(st.session_state.g, st.session_state.selected_repo)
+                get_save_flusher().journal.enqueue(repo.full_name, branch, st.session_state.selected_file, st.session_state.file_content,
+                                           commit_message or f"Update {st.session_state.selected_file}", get_session_id(),
+                                           base=st.session_state.file_sha)
+                # Once flushed the branch holds this blob, so the next save is based on it
+                st.session_state.file_sha = git_blob_sha(st.session_state.file_content.encode())
+                get_repo_store().put_blob(st.session_state.file_sha, st.session_state.file_content.encode(), fetched=False)
+                st.session_state.write_behind_used = True
+                st.rerun()
             st.write("***Attempting to update the file...***")
             try:
-                repo = st.session_state.g.get_user().get_repo(st.session_state.selected_repo)
-                contents = repo.get_contents(st.session_state.selected_file)
-                repo.update_file(contents.path, commit_message, st.session_state.file_content, contents.sha)
+                with span("github.commit_file"):
+                    repo = get_repo(st.session_state.g, st.session_state.selected_repo)
+                    if new_branch:
+                        if not new_branch_name:
+                            raise ValueError("Enter a name for the new branch.")
+                        create_branch(st.session_state.g, st.session_state.selected_repo, new_branch_name, st.session_state.get('selected_ref'))
+                        branch = new_branch_name
+                    branch = branch or repo.default_branch
+                    contents = repo.get_contents(st.session_state.selected_file, ref=branch)
+                    result = repo.update_file(contents.path, commit_message, st.session_state.file_content, contents.sha, branch=branch)
+                    note_own_commit(st.session_state.selected_repo, result, branch)
+                    st.session_state.selected_ref = branch
+                    st.session_state.file_sha = result['content'].sha
+                    get_repo_store().put_blob(result['content'].sha, st.session_state.file_content.encode(), fetched=False)
                 st.success(f"File '{st.session_state.selected_file}' updated successfully. This message will self-destruct in 5 seconds...", icon=':material/sentiment_satisfied:')
                 time.sleep(5)
                 st.rerun()
@@ -338,26 +948,52 @@ def dialog_update():
 #    if save_button:
 #        dialog_update(commit_message)
 
+def remove_sandbox_pages(leases):
+    # A slot's page is only useful while the lease lasts; left behind it shows up as a stale page in the user's app
+    for slot, lease in leases.items():
+        for repo_name, branch in lease.get('files', []):
+            try:
+                repo = st.session_state.g.get_repo(repo_name)
+                contents = repo.get_contents(slot_path(slot), ref=branch)
+                repo.delete_file(contents.path, f"Remove {slot_path(slot).split('/')[-1]}", contents.sha, branch=branch)
+            except GithubException:
+                # Already gone, or the branch was deleted; nothing left to clean up
+                continue
+
 @st.fragment
+@traced("sandbox.run")
 def execute_code_sandbox():
     #exec_button = st.button("Execute code",key="exec_code_sandbox")
     #if exec_button:
         # Write st.session_state.file_content to a sandbox.py file which is saved in a Github repo
+    # Each session leases its own sandbox page so parallel users never overwrite each other's runs
+    session_id = get_session_id()
+    remove_sandbox_pages(expire_slots())
+    slot = lease_slot(session_id)
+    if slot is None:
+        st.error(f"All {SLOT_CAP} sandbox slots are in use. Please try again in a few minutes.", icon=':material/sentiment_dissatisfied:')
+        return
+    st.session_state.sandbox_slot = slot
+    file_path = slot_path(slot)
+    if not check_code(file_path):
+        return
     try:
-        repo = st.session_state.g.get_user().get_repo(st.session_state.selected_repo)
-        file_path = 'pages/sandbox.py'
+        repo = get_repo(st.session_state.g, st.session_state.selected_repo)
+        branch = current_branch() or repo.default_branch
         content = st.session_state.file_content
-        commit_message = 'Update sandbox.py'
+        commit_message = f'Update {file_path.split("/")[-1]}'
         try:
             # Try to get the file contents (if it exists)
-            contents = repo.get_contents(file_path)
-            repo.update_file(file_path, commit_message, content, contents.sha)
+            contents = repo.get_contents(file_path, ref=branch)
+            result = repo.update_file(file_path, commit_message, content, contents.sha, branch=branch)
         except GithubException as e:
             if e.status == 404:  # File not found
                 # If the file doesn't exist, create it
-                repo.create_file(file_path, commit_message, content)
+                result = repo.create_file(file_path, commit_message, content, branch=branch)
             else:
                 raise  # Re-raise the exception if it's not a 404 error
+        note_own_commit(st.session_state.selected_repo, result, branch)
+        record_run(session_id, slot, repo.full_name, branch)
         #st.page_link("Click to view the output of the file", "code_output.py")
         st.success(f"Code output saved to {file_path} in the repository.",  icon=':material/sentiment_satisfied:')
     except Exception as e:
@@ -367,6 +1003,9 @@ def execute_code_sandbox():
 def main():
     if 'authenticated' not in st.session_state:
         st.session_state.authenticated = False
+    # Saves left in the journal by a crash or restart are flushed without waiting for a session to opt in
+    if get_save_journal().has_pending():
+        get_save_flusher()
     
     if not st.session_state.authenticated:
         g = github_auth()
@@ -377,25 +1016,38 @@ def main():
     
     if st.session_state.authenticated:
         try:
-            link_col1, link_col2, popmenu_col3, empty_col=st.columns([1,1,1,6], vertical_alignment="bottom")
+            link_col1, link_col2, link_col3, popmenu_col3, empty_col=st.columns([1,1,1,1,5], vertical_alignment="bottom")
             with link_col1:
                 st.page_link("app.py", label="Code editor", icon=":material/terminal:")
             with link_col2:
-                st.page_link("https://streamcoder.ploomberapp.io/sandbox", label="Sandbox", icon=":material/play_circle:")
+                slot = st.session_state.get('sandbox_slot')
+                if slot is None:
+                    st.page_link(f"{SANDBOX_URL}/sandbox", label="Sandbox", icon=":material/play_circle:")
+                else:
+                    st.page_link(f"{SANDBOX_URL}/{slot_page(slot)}", label=f"Sandbox {slot}", icon=":material/play_circle:")
+            with link_col3:
+                st.page_link("pages/admin.py", label="Tracing", icon=":material/monitoring:")
             with popmenu_col3:
                 with st.popover("Repo actions", use_container_width=True):
                     repo_col1, repo_col2,repo_col3,repo_col4,=st.columns([5,5,5,5], vertical_alignment="bottom")
                     with repo_col1:
                         if st.button("Choose file from a repo"):
+                            set_action("choose_file")
                             file_selector_dialog()
                     with repo_col2:
                         if st.button("Create/Delete Repositories"):
+                            set_action("repo_management")
                             repo_management_dialog()
                     with repo_col3:
                         if st.button("Create/Delete Files in Repo"):
+                            set_action("file_management")
                             file_management_dialog()
                     with repo_col4:
                         if st.button("Logout"):
+                            set_action("logout")
+                            if 'session_id' in st.session_state:
+                                remove_sandbox_pages(release_slot(st.session_state.session_id))
+                                st.session_state.pop('sandbox_slot', None)
                             st.session_state.authenticated = False
                             st.session_state.github_token = ''
                             if 'g' in st.session_state:
@@ -407,27 +1059,45 @@ def main():
     
                    with editor_col1:
                         with st.popover("Enter prompt", use_container_width=True):
-                            st.session_state.selected_llm = st.selectbox("Choose LLM:", ["Sonnet-3.5", "GPT-4o"])
+                            st.session_state.selected_llm = st.selectbox("Choose LLM:", list(MODELS))
+                            latency_stats = get_latency_stats()
+                            for model_name in MODELS:
+                                st.caption(model_summary(latency_stats, model_name))
+                            if any(latency_stats.count(model_name) for model_name in MODELS):
+                                st.bar_chart(pd.DataFrame({model_name: latency_stats.histogram(model_name) for model_name in MODELS}, index=histogram_labels()),
+                                    height=150, stack=False)
                             #col1, col2  = st.columns([6, 3])
                             #with col1:
                             prompt = st.text_area(label="User prompt", label_visibility="collapsed", placeholder="Enter your prompt for code generation and click.", 
                                 height=300)
                             #with col2:
                             if st.button("Execute prompt", key='exec_prompt'):
+                                    set_action("execute_prompt")
                                     with st.spinner("Executing your prompt..."):
-                                        generated_code = generate_code_with_llm(prompt, st.session_state.file_content)
+                                        generated_code = generate_code_with_llm(prompt, assemble_buffer())
                                         if generated_code:
                                             st.session_state.file_content = generated_code
+                                            st.session_state.show_diff = True
                                             st.rerun()
                                         else:
-                                            st.error("Failed to generate code. Please check your API key.")    
+                                            st.error("Failed to generate code. Please check your API key.")
+                            if st.button("Apply a prompt to many files...", key='open_batch'):
+                                set_action("open_batch")
+                                batch_prompt_dialog()
             #with col3:
             #    pass
                    with editor_col2:
-                         st.info(f"***Current repository/file***: {st.session_state.selected_repo} / {st.session_state.selected_file}", icon=":material/my_location:")
+                         st.info(f"***Current repository/ref/file***: {st.session_state.selected_repo} / {st.session_state.get('selected_ref') or 'default'} / {st.session_state.selected_file}", icon=":material/my_location:")
                    
             if 'selected_file' in st.session_state:
-                   code_editor_and_prompt()    
+                   watch_branch_head()
+                   if st.session_state.get('write_behind_used'):
+                       save_queue_status()
+                   code_editor_and_prompt()
+                   # Lives outside the save dialog so the choice also applies to sandbox runs
+                   st.checkbox("Lint before saving and running", key='lint_code')
+                   if st.toggle("Show changes against the committed version", key='show_diff'):
+                       render_diff('editor_diff')    
             
             #save_changes()
                 #execute_code_sandbox()
@@ -440,7 +1110,13 @@ def main():
             st.rerun()
 
 if __name__ == "__main__":
-    main()
+    # Every script run is one trace; the admin page can ask for the next one to be profiled
+    profile_engine = st.session_state.pop('profile_next_rerun', None)
+    with span("rerun", page="app.py"):
+        if profile_engine:
+            profile_call(main, profile_engine, lambda report: st.session_state.__setitem__('last_profile', report))
+        else:
+            main()
 
 # CSS to style the app
 st.markdown("""
@@ -0,0 +1,133 @@
+import ast
+import hashlib
+import importlib.util
+import io
+import re
+import sys
+import threading
+from collections import OrderedDict
+
+VALIDATION_TIMEOUT = 10
+CACHE_SIZE = 256
+
+FENCE_RE = re.compile(r"^\s*```[\w+-]*\s*$")
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compiles(source):
+    try:
+        compile(source, '<editor>', 'exec', ast.PyCF_ONLY_AST)
+        return True
+    except (SyntaxError, ValueError):
+        return False
+
+
+def strip_fences(source):
+    # LLM output often wraps the code in ```python ... ``` fences, sometimes with prose around them.
+    # Valid code is never touched: a fence line inside a docstring is just text.
+    if compiles(source):
+        return source, False
+    lines = source.splitlines(keepends=True)
+    fences = [i for i, line in enumerate(lines) if FENCE_RE.match(line)]
+    if not fences:
+        return source, False
+    if len(fences) == 1:
+        return ''.join(line for i, line in enumerate(lines) if i != fences[0]), True
+    blocks = []
+    for start, end in zip(fences[::2], fences[1::2]):
+        blocks.append(''.join(lines[start + 1:end]))
+    return '\n'.join(blocks), True
+
+
+def local_module_names(paths):
+    # Every directory and .py stem in the edited repo may be importable from some entry point
+    names = set()
+    for path in paths:
+        parts = path.split('/')
+        if not parts[-1].endswith('.py'):
+            continue
+        parts[-1] = parts[-1][:-3]
+        names.update(parts)
+    return frozenset(names)
+
+
+def guarded_imports(tree):
+    # Imports inside `try: ... except ImportError:` are optional by design
+    guarded = set()
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Try):
+            continue
+        for handler in node.handlers:
+            caught = handler.type
+            names = caught.elts if isinstance(caught, ast.Tuple) else [caught]
+            if caught is None or any(isinstance(name, ast.Name) and name.id in ('ImportError', 'ModuleNotFoundError', 'Exception') for name in names):
+                guarded.update(id(child) for stmt in node.body for child in ast.walk(stmt))
+                break
+    return guarded
+
+
+def check_imports(tree, local_modules=frozenset()):
+    # Only top-level names are resolved, so nothing gets imported while checking. The app's own
+    # environment is not the edited repo's, so a missing module is only worth a warning.
+    missing = []
+    guarded = guarded_imports(tree)
+    for node in ast.walk(tree):
+        if id(node) in guarded:
+            continue
+        if isinstance(node, ast.Import):
+            names = [(alias.name, node.lineno) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            names = [(node.module, node.lineno)]
+        else:
+            continue
+        for name, lineno in names:
+            top = name.split('.')[0]
+            if top in sys.builtin_module_names or top in local_modules or top in missing:
+                continue
+            if importlib.util.find_spec(top) is None:
+                missing.append(top)
+                yield f"Line {lineno}: module '{top}' is not installed"
+
+
+def lint(source, filename):
+    try:
+        from pyflakes.api import check
+        from pyflakes.reporter import Reporter
+    except ImportError:
+        return ["pyflakes is not installed, lint skipped"]
+    out = io.StringIO()
+    check(source, filename, Reporter(out, out))
+    return [line for line in out.getvalue().splitlines() if line]
+
+
+def validate_source(source, filename='<editor>', run_lint=False, local_modules=frozenset()):
+    # Runs in a worker process; everything returned must be picklable
+    code, fences_stripped = strip_fences(source)
+    result = {'code': code, 'fences_stripped': fences_stripped, 'errors': [], 'warnings': []}
+    try:
+        tree = compile(code, filename, 'exec', ast.PyCF_ONLY_AST)
+        compile(tree, filename, 'exec')
+    except SyntaxError as e:
+        result['errors'].append(f"Line {e.lineno}: {e.msg}")
+        return result
+    result['warnings'].extend(check_imports(tree, local_modules))
+    if run_lint:
+        result['warnings'].extend(lint(code, filename))
+    return result
+
+
+def validate_cached(executor, source, filename='<editor>', run_lint=False, local_modules=frozenset()):
+    # Results are keyed by content hash, so an unchanged buffer is never validated twice
+    key = (hashlib.sha256(source.encode()).hexdigest(), filename, run_lint, local_modules)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = executor.submit(validate_source, source, filename, run_lint, local_modules).result(timeout=VALIDATION_TIMEOUT)
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
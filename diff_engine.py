@@ -0,0 +1,175 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+MAX_EDIT_DISTANCE = 2000
+CACHE_SIZE = 32
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def buffer_hash(text):
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+def _intern_lines(a_lines, b_lines):
+    # Compare small ints instead of strings: each distinct line gets one id
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in a_lines]
+    b = [ids.setdefault(line, len(ids)) for line in b_lines]
+    return a, b
+
+
+def _myers(a, b):
+    # Greedy O(ND) Myers diff; returns the edit script as (tag, index) pairs,
+    # or None when the edit distance exceeds MAX_EDIT_DISTANCE
+    n, m = len(a), len(b)
+    max_d = min(n + m, MAX_EDIT_DISTANCE)
+    offset = max_d + 1
+    v = [0] * (2 * max_d + 3)
+    trace = []
+    for d in range(max_d + 1):
+        trace.append(v[offset - d:offset + d + 1] if d else [v[offset]])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, d, n, m)
+    return None
+
+
+def _backtrack(trace, d_final, n, m):
+    script = []
+    x, y = n, m
+    for d in range(d_final, 0, -1):
+        # trace[d] holds V as it was before step d, sliced from diagonal -d
+        prev = trace[d]
+        k = x - y
+        if k == -d or (k != d and prev[k - 1 + d] < prev[k + 1 + d]):
+            prev_k = k + 1
+        else:
+            prev_k = k - 1
+        prev_x = prev[prev_k + d]
+        prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            script.append(('equal', x, y))
+        if prev_k == k + 1:
+            y -= 1
+            script.append(('insert', x, y))
+        else:
+            x -= 1
+            script.append(('delete', x, y))
+    while x > 0 and y > 0:
+        x -= 1
+        y -= 1
+        script.append(('equal', x, y))
+    script.reverse()
+    return script
+
+
+def get_opcodes(a_lines, b_lines):
+    # difflib-style opcodes; common prefix and suffix are stripped before running Myers
+    n, m = len(a_lines), len(b_lines)
+    prefix = 0
+    while prefix < n and prefix < m and a_lines[prefix] == b_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < n - prefix and suffix < m - prefix and a_lines[n - 1 - suffix] == b_lines[m - 1 - suffix]:
+        suffix += 1
+    opcodes = []
+    if prefix:
+        opcodes.append(['equal', 0, prefix, 0, prefix])
+    a, b = _intern_lines(a_lines[prefix:n - suffix], b_lines[prefix:m - suffix])
+    script = _myers(a, b) if a and b else None
+    if script is None:
+        if a or b:
+            tag = 'replace' if a and b else ('delete' if a else 'insert')
+            opcodes.append([tag, prefix, n - suffix, prefix, m - suffix])
+    else:
+        for op, x, y in script:
+            i, j = x + prefix, y + prefix
+            if op == 'equal':
+                i2, j2 = i + 1, j + 1
+            elif op == 'delete':
+                i2, j2 = i + 1, j
+            else:
+                i2, j2 = i, j + 1
+            last = opcodes[-1] if opcodes else None
+            if last and last[2] == i and last[4] == j and (last[0] == op or {last[0], op} <= {'delete', 'insert', 'replace'}):
+                if last[0] != op:
+                    last[0] = 'replace'
+                last[2], last[4] = i2, j2
+            else:
+                opcodes.append([op, i, i2, j, j2])
+    if suffix:
+        opcodes.append(['equal', n - suffix, n, m - suffix, m])
+    return [tuple(op) for op in opcodes]
+
+
+def group_hunks(opcodes, context=3):
+    # Split opcodes into hunks of changes with up to `context` unchanged lines around them
+    hunks = []
+    current = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag == 'equal':
+            if current and i2 - i1 > 2 * context:
+                current.append((tag, i1, i1 + context, j1, j1 + context))
+                hunks.append(current)
+                current = []
+            if not current:
+                i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        current.append((tag, i1, i2, j1, j2))
+    if current and not (len(current) == 1 and current[0][0] == 'equal'):
+        tag, i1, i2, j1, j2 = current[-1]
+        if tag == 'equal':
+            current[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+        hunks.append(current)
+    return hunks
+
+
+def render_hunk(hunk, a_lines, b_lines):
+    i1, j1 = hunk[0][1], hunk[0][3]
+    i2, j2 = hunk[-1][2], hunk[-1][4]
+    header = f"@@ -{i1 + 1},{i2 - i1} +{j1 + 1},{j2 - j1} @@"
+    out = []
+    for tag, a1, a2, b1, b2 in hunk:
+        if tag == 'equal':
+            out.extend(' ' + line for line in a_lines[a1:a2])
+            continue
+        out.extend('-' + line for line in a_lines[a1:a2])
+        out.extend('+' + line for line in b_lines[b1:b2])
+    return header, '\n'.join(out)
+
+
+def diff_texts(base_sha, base_text, buffer_text, context=3):
+    # Cached per (base SHA, buffer hash, context) so reruns with an unchanged buffer are free
+    key = (base_sha, buffer_hash(buffer_text), context)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    a_lines = base_text.splitlines()
+    b_lines = buffer_text.splitlines()
+    opcodes = get_opcodes(a_lines, b_lines)
+    added = sum(j2 - j1 for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+    removed = sum(i2 - i1 for tag, i1, i2, j1, j2 in opcodes if tag != 'equal')
+    result = {
+        'added': added,
+        'removed': removed,
+        'hunks': [render_hunk(hunk, a_lines, b_lines) for hunk in group_hunks(opcodes, context)],
+    }
+    with _cache_lock:
+        _cache[key] = result
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
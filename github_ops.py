@@ -0,0 +1,64 @@
+from github import GithubException, InputGitTreeElement
+
+DEFAULT_MODE = '100644'
+FAST_FORWARD_RETRIES = 3
+
+
+class StaleBaseError(Exception):
+    # Files changed on the branch after the edits being committed were based on them
+    def __init__(self, paths):
+        super().__init__("Changed on the branch since they were read: " + ", ".join(paths))
+        self.paths = paths
+
+
+def head_entries(repo, tree_sha, paths):
+    # Mode and blob SHA of each path that exists in a tree, reading only the directories on the way to them
+    trees = {'': tree_sha}
+    listings = {}
+    found = {}
+    for path in sorted(paths):
+        parts = path.split('/')
+        directory = ''
+        for i, name in enumerate(parts):
+            if directory not in listings:
+                if trees.get(directory) is None:
+                    break
+                listings[directory] = {element.path: element for element in repo.get_git_tree(trees[directory]).tree}
+            element = listings[directory].get(name)
+            if element is None:
+                break
+            if i == len(parts) - 1:
+                if element.type == 'blob':
+                    found[path] = (element.mode, element.sha)
+            else:
+                directory = f"{directory}{name}/"
+                trees[directory] = element.sha if element.type == 'tree' else None
+    return found
+
+
+def is_not_fast_forward(e):
+    return isinstance(e, GithubException) and e.status == 422 and 'fast forward' in str(e.data).lower()
+
+
+def commit_files(repo, branch, files, message, base=None):
+    # One commit for many files via the git data API: a tree on top of the branch head, the commit, then the ref.
+    # With `base` (path -> blob SHA the edits started from) paths in it that changed upstream since are refused.
+    for attempt in range(FAST_FORWARD_RETRIES + 1):
+        ref = repo.get_git_ref(f"heads/{branch}")
+        head = repo.get_git_commit(ref.object.sha)
+        current = head_entries(repo, head.tree.sha, files)
+        if base is not None:
+            stale = [path for path in files if path in base and current.get(path, (None, None))[1] != base[path]]
+            if stale:
+                raise StaleBaseError(stale)
+        # Existing files keep their mode, so scripts stay executable
+        elements = [InputGitTreeElement(path, current.get(path, (DEFAULT_MODE,))[0], 'blob', content=content) for path, content in files.items()]
+        tree = repo.create_git_tree(elements, head.tree)
+        commit = repo.create_git_commit(message, tree, [head])
+        # Not forced: if someone pushed in between, rebuild on the new head instead of dropping their commit
+        try:
+            ref.edit(commit.sha)
+            return commit
+        except GithubException as e:
+            if not is_not_fast_forward(e) or attempt == FAST_FORWARD_RETRIES:
+                raise
@@ -0,0 +1,155 @@
+import asyncio
+import random
+import time
+
+import anthropic
+import openai
+
+from tracing import span
+
+SYSTEM_PROMPT = "You are an expert Python programmer. Respond only with clean Python code that addresses the user's request, do not add (!) any of your explanations, do not add (!) any quote characters. You may comment the code using commenting markup. By default output full code unless specified by the user prompt."
+MAX_TOKENS = 8192
+MAX_RETRIES = 5
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504, 529)
+
+# Provider limits are per account tier; prices are USD per million tokens
+MODELS = {
+    'Sonnet-3.5': {'provider': 'anthropic', 'secret': 'ANTHROPIC_API_KEY', 'model': 'claude-3-5-sonnet-20240620', 'rpm': 50, 'tpm': 40000, 'input_cost': 3.0, 'output_cost': 15.0},
+    'GPT-4o': {'provider': 'openai', 'secret': 'OPENAI_API_KEY', 'model': 'gpt-4o', 'rpm': 500, 'tpm': 30000, 'input_cost': 5.0, 'output_cost': 15.0},
+}
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.tokens = per_minute
+        self.rate = per_minute / 60
+        self.updated = time.monotonic()
+
+    async def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+# Requests-per-minute and tokens-per-minute buckets for one provider model
+class RateLimiter:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    async def acquire(self, tokens):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+
+def make_client(model_name, api_key):
+    # SDK retries are off; retries go through the rate limiter instead
+    if MODELS[model_name]['provider'] == 'anthropic':
+        return anthropic.AsyncAnthropic(api_key=api_key, max_retries=0)
+    return openai.AsyncOpenAI(api_key=api_key, max_retries=0)
+
+
+def is_retryable(e):
+    if isinstance(e, (anthropic.APIConnectionError, openai.APIConnectionError)):
+        return True
+    return getattr(e, 'status_code', None) in RETRYABLE_STATUS
+
+
+def retry_delay(e, attempt):
+    response = getattr(e, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return float(retry_after)
+    except (TypeError, ValueError):
+        return min(60, 2 ** attempt) + random.random()
+
+
+async def _request(client, model_name, prompt, code):
+    model = MODELS[model_name]
+    if model['provider'] == 'anthropic':
+        message = await client.messages.create(
+            model=model['model'],
+            max_tokens=MAX_TOKENS,
+            temperature=0,
+            system=SYSTEM_PROMPT,
+            messages=[{"role": "user", "content": [{"type": "text", "text": prompt + " " + code}]}])
+        return message.content[0].text, message.usage.input_tokens, message.usage.output_tokens
+    completion = await client.chat.completions.create(
+        model=model['model'],
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt + " " + code}
+        ]
+    )
+    return completion.choices[0].message.content, completion.usage.prompt_tokens, completion.usage.completion_tokens
+
+
+async def complete(client, model_name, prompt, code, limiter=None, max_retries=MAX_RETRIES):
+    # One completion, retried with backoff on rate limits and overloads
+    attempt = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire(estimate_tokens(SYSTEM_PROMPT + prompt + code) + MAX_TOKENS // 4)
+        try:
+            with span("llm.request", model=model_name, attempt=attempt):
+                return await _request(client, model_name, prompt, code)
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            await asyncio.sleep(retry_delay(e, attempt))
+            attempt += 1
+
+
+def cost(model_name, input_tokens, output_tokens):
+    model = MODELS[model_name]
+    return (input_tokens * model['input_cost'] + output_tokens * model['output_cost']) / 1_000_000
+
+
+async def run_batch(model_name, api_key, prompt, files, concurrency=8):
+    # Applies one prompt to every file concurrently; failures are collected per file instead of aborting the batch
+    model = MODELS[model_name]
+    limiter = RateLimiter(model['rpm'], model['tpm'])
+    semaphore = asyncio.Semaphore(concurrency)
+    client = make_client(model_name, api_key)
+    results = {}
+    started = time.perf_counter()
+
+    async def process(path, code):
+        async with semaphore:
+            call_started = time.perf_counter()
+            try:
+                text, input_tokens, output_tokens = await complete(client, model_name, prompt, code, limiter)
+                results[path] = {'content': text, 'input_tokens': input_tokens, 'output_tokens': output_tokens}
+            except Exception as e:
+                results[path] = {'error': str(e), 'input_tokens': 0, 'output_tokens': 0}
+            results[path]['seconds'] = time.perf_counter() - call_started
+
+    try:
+        await asyncio.gather(*(process(path, code) for path, code in files.items()))
+    finally:
+        await client.close()
+    seconds = time.perf_counter() - started
+    input_tokens = sum(r['input_tokens'] for r in results.values())
+    output_tokens = sum(r['output_tokens'] for r in results.values())
+    stats = {
+        'files': len(files),
+        'failed': sum(1 for r in results.values() if 'error' in r),
+        'seconds': seconds,
+        'files_per_minute': len(files) / seconds * 60 if seconds else 0.0,
+        'output_tokens_per_second': output_tokens / seconds if seconds else 0.0,
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'cost': cost(model_name, input_tokens, output_tokens),
+    }
+    return results, stats
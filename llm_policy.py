@@ -0,0 +1,133 @@
+import asyncio
+import threading
+import time
+from collections import deque
+
+from llm_async import make_client, complete
+
+HISTORY_SIZE = 200
+MIN_SAMPLES = 5
+DEFAULT_TIMEOUT = 120
+MIN_TIMEOUT = 30
+TIMEOUT_FACTOR = 2.0
+DEFAULT_HEDGE_DELAY = 45
+MIN_HEDGE_DELAY = 5
+HISTOGRAM_BUCKETS = [2, 5, 10, 20, 30, 60, 120]
+
+
+# Recent successful latencies per model, shared by every session in the process
+class LatencyStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, model_name, seconds):
+        with self.lock:
+            self.samples.setdefault(model_name, deque(maxlen=HISTORY_SIZE)).append(seconds)
+
+    def percentile(self, model_name, pct):
+        with self.lock:
+            values = sorted(self.samples.get(model_name, ()))
+        if len(values) < MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+    def timeout(self, model_name):
+        p95 = self.percentile(model_name, 95)
+        return DEFAULT_TIMEOUT if p95 is None else max(MIN_TIMEOUT, p95 * TIMEOUT_FACTOR)
+
+    def hedge_delay(self, model_name):
+        # A request still running past the model's own p95 is likely stuck; that is when a duplicate pays off
+        p95 = self.percentile(model_name, 95)
+        return DEFAULT_HEDGE_DELAY if p95 is None else max(MIN_HEDGE_DELAY, p95)
+
+    def histogram(self, model_name):
+        with self.lock:
+            values = list(self.samples.get(model_name, ()))
+        counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        for value in values:
+            index = next((i for i, bound in enumerate(HISTOGRAM_BUCKETS) if value <= bound), len(HISTOGRAM_BUCKETS))
+            counts[index] += 1
+        return counts
+
+    def count(self, model_name):
+        with self.lock:
+            return len(self.samples.get(model_name, ()))
+
+
+def histogram_labels():
+    labels = [f"<= {bound}s" for bound in HISTOGRAM_BUCKETS]
+    return labels + [f"> {HISTOGRAM_BUCKETS[-1]}s"]
+
+
+def pick_backup(primary, api_keys):
+    # Prefer the other provider; fall back to a duplicate of the same model
+    others = [name for name in api_keys if name != primary]
+    return others[0] if others else primary
+
+
+async def hedged_complete(primary, api_keys, prompt, code, stats):
+    # Returns (text, model_name) from the first request that produces non-empty output.
+    # A backup request starts when the primary errors or runs past its hedge delay; whichever
+    # is still running when the other wins is cancelled.
+    loop = asyncio.get_running_loop()
+    tasks = {}
+    errors = []
+
+    async def attempt(model_name):
+        client = make_client(model_name, api_keys[model_name])
+        started = time.perf_counter()
+        try:
+            text = (await complete(client, model_name, prompt, code, max_retries=1))[0]
+        except asyncio.CancelledError:
+            # Cut off by the deadline or a faster winner: the real latency is at least the elapsed time.
+            # Such a censored sample is only kept once it reaches the model's hedge delay (its p95), so
+            # slow requests keep the tail honest while losers cut short cannot drag it down.
+            elapsed = time.perf_counter() - started
+            if elapsed >= stats.hedge_delay(model_name):
+                stats.record(model_name, elapsed)
+            raise
+        finally:
+            await client.close()
+        if not text or not text.strip():
+            raise ValueError(f"{model_name} returned an empty response")
+        stats.record(model_name, time.perf_counter() - started)
+        return text
+
+    def start(model_name):
+        tasks[asyncio.ensure_future(attempt(model_name))] = model_name
+        return loop.time() + stats.timeout(model_name)
+
+    deadline = start(primary)
+    hedge_at = loop.time() + stats.hedge_delay(primary)
+    hedged = False
+    try:
+        while tasks:
+            now = loop.time()
+            if now >= deadline:
+                break
+            wake = deadline if hedged else min(deadline, hedge_at)
+            done, _ = await asyncio.wait(tasks, timeout=max(0, wake - now), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                model_name = tasks.pop(task)
+                if task.exception() is None:
+                    return task.result(), model_name
+                errors.append(f"{model_name}: {task.exception()}")
+            if not hedged and (errors or loop.time() >= hedge_at):
+                hedged = True
+                deadline = max(deadline, start(pick_backup(primary, api_keys)))
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if errors:
+        raise RuntimeError("; ".join(errors))
+    raise TimeoutError(f"No response from {primary} within {stats.timeout(primary):.0f}s")
+
+
+def model_summary(stats, model_name):
+    p50, p95 = stats.percentile(model_name, 50), stats.percentile(model_name, 95)
+    if p50 is None:
+        return f"{model_name}: {stats.count(model_name)} sample(s), default {DEFAULT_TIMEOUT}s timeout"
+    return f"{model_name}: p50 {p50:.1f}s, p95 {p95:.1f}s, timeout {stats.timeout(model_name):.0f}s, hedge after {stats.hedge_delay(model_name):.0f}s"
+
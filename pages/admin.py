@@ -0,0 +1,43 @@
+import time
+import streamlit as st
+from tracing import read_spans, latency_summary, action_counts
+from sandbox_slots import list_slots, SLOT_CAP
+
+st.set_page_config(page_title="Tracing and profiling", layout="wide")
+
+st.page_link("app.py", label="Code editor", icon=":material/terminal:")
+st.header("Tracing and profiling")
+
+spans = read_spans()
+if not spans:
+    st.info("No spans recorded yet. Use the code editor and come back.", icon=":material/info:")
+else:
+    st.caption(f"{len(spans)} spans from the local trace files")
+    st.subheader("Latency per span")
+    st.dataframe(latency_summary(spans), use_container_width=True, hide_index=True)
+    st.subheader("Calls per user action")
+    st.dataframe(action_counts(spans), use_container_width=True, hide_index=True)
+
+st.subheader(f"Sandbox slots ({SLOT_CAP} max)")
+slots = list_slots()
+if slots:
+    now = time.time()
+    st.dataframe([
+        {
+            'slot': slot,
+            'session': lease['session'][:8],
+            'idle minutes': round((now - lease['last_used']) / 60, 1),
+            'last run': time.strftime("%H:%M:%S", time.localtime(lease['last_run'])) if lease['last_run'] else '',
+        }
+        for slot, lease in sorted(slots.items())
+    ], use_container_width=True, hide_index=True)
+else:
+    st.caption("No sandbox slots leased.")
+
+st.subheader("Profile a single rerun")
+engine = st.radio("Profiler:", ["cProfile", "pyinstrument"], horizontal=True)
+if st.button("Profile the next editor rerun"):
+    st.session_state.profile_next_rerun = engine
+    st.info("Go back to the code editor and interact with it; the next rerun will be profiled.", icon=":material/info:")
+if 'last_profile' in st.session_state:
+    st.code(st.session_state.last_profile, language=None)
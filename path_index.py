@@ -0,0 +1,118 @@
+import heapq
+import re
+
+MATCH_LIMIT = 50
+SEPARATORS = '/_-. '
+
+
+def char_mask(text):
+    # One bit per character class; a path can only match if it contains every character of the query
+    mask = 0
+    for ch in text:
+        mask |= 1 << (ord(ch) % 63)
+    return mask
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def segment_starts(text):
+    return {0} | {i + 1 for i, ch in enumerate(text) if ch in SEPARATORS}
+
+
+# Lowercased paths, basenames, segment boundaries, character masks and trigram postings for
+# one tree, computed once so each query only touches the paths that can still match.
+class PathIndex:
+    def __init__(self, paths):
+        self.paths = sorted(paths)
+        self.lower = [path.lower() for path in self.paths]
+        self.base_start = [path.rfind('/') + 1 for path in self.lower]
+        self.bases = [path[start:] for path, start in zip(self.lower, self.base_start)]
+        self.base_prefixes = {}
+        for i, base in enumerate(self.bases):
+            for prefix in {base[:1], base[:2]}:
+                self.base_prefixes.setdefault(prefix, []).append(i)
+        self.masks = [char_mask(path) for path in self.lower]
+        self.postings = {}
+        for i, path in enumerate(self.lower):
+            for gram in trigrams(path):
+                self.postings.setdefault(gram, []).append(i)
+        self._last = ('', None)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def _substring_candidates(self, token):
+        # Intersect the postings of the token's trigrams, smallest list first
+        lists = sorted((self.postings.get(gram, ()) for gram in trigrams(token)), key=len)
+        if not lists or not lists[0]:
+            return []
+        found = set(lists[0])
+        for posting in lists[1:]:
+            found.intersection_update(posting)
+            if not found:
+                break
+        return [i for i in found if token in self.lower[i]]
+
+    def _candidates(self, tokens, query):
+        last_query, last_candidates = self._last
+        if last_candidates is not None and last_query and query.startswith(last_query):
+            # Typing extends the previous query, so its matches are a superset of the new ones
+            pool = last_candidates
+        else:
+            pool = range(len(self.paths))
+        mask = char_mask(''.join(tokens))
+        patterns = [re.compile('.*?'.join(map(re.escape, token))) for token in tokens]
+        return [i for i in pool if self.masks[i] & mask == mask and all(p.search(self.lower[i]) for p in patterns)]
+
+    def _score(self, i, tokens):
+        path = self.lower[i]
+        base_start = self.base_start[i]
+        base = path[base_start:]
+        starts = None
+        score = 0.0
+        for token in tokens:
+            if base == token or base.rsplit('.', 1)[0] == token:
+                score += 300
+            elif base.startswith(token):
+                score += 200
+            elif token in base:
+                score += 120
+            elif token in path:
+                at = path.find(token)
+                score += 80 if at == 0 or path[at - 1] in SEPARATORS else 60
+            else:
+                # Subsequence only: reward characters that land on segment boundaries or inside the basename
+                if starts is None:
+                    starts = segment_starts(path)
+                pos = -1
+                for ch in token:
+                    pos = path.find(ch, pos + 1)
+                    score += 4 if pos in starts else 0
+                    score += 2 if pos >= base_start else 0
+        return score - len(path) * 0.2 - path.count('/') * 2
+
+    def _tiers(self, token):
+        # Basename matches, then path substring matches: each tier scores above everything after it
+        if len(token) <= 2:
+            return [self.base_prefixes.get(token, [])]
+        substring_hits = self._substring_candidates(token)
+        return [[i for i in substring_hits if token in self.bases[i]], substring_hits]
+
+    def search(self, query, limit=MATCH_LIMIT):
+        # Returns (matches, total): the best `limit` paths and how many paths matched. When one of the
+        # top tiers already holds `limit` matches only that tier is ranked, and total counts just it.
+        query = query.strip().lower()
+        if not query:
+            return self.paths[:limit], len(self.paths)
+        tokens = query.split()
+        tier = next((tier for tier in (self._tiers(query) if len(tokens) == 1 else []) if len(tier) >= limit), None)
+        if tier is not None:
+            candidates = tier
+            self._last = ('', None)
+        else:
+            candidates = self._candidates(tokens, query)
+            self._last = (query, candidates)
+        best = heapq.nlargest(limit, candidates, key=lambda i: (self._score(i, tokens), -i))
+        return [self.paths[i] for i in best], len(candidates)
@@ -0,0 +1,131 @@
+import ast
+import base64
+import posixpath
+import threading
+
+from tracing import span
+
+SESSION_BYTE_BUDGET = 5 * 1024 * 1024
+MIN_RATE_LIMIT_REMAINING = 500
+MAX_CANDIDATES = 24
+
+
+def _module_paths(module, base_dirs):
+    parts = module.split('.')
+    for base in base_dirs:
+        stem = posixpath.join(base, *parts) if base else posixpath.join(*parts)
+        yield stem + '.py'
+        yield posixpath.join(stem, '__init__.py')
+
+
+def import_candidates(source, file_path, entries):
+    # Repo files the open Python file imports, resolved from the repo root and from the file's own directory
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    file_dir = posixpath.dirname(file_path)
+    base_dirs = [''] + ([file_dir] if file_dir else [])
+    candidates = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                candidates.extend(_module_paths(alias.name, base_dirs))
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                package_dir = file_dir
+                for _ in range(node.level - 1):
+                    package_dir = posixpath.dirname(package_dir)
+                bases = [package_dir]
+            else:
+                bases = base_dirs
+            modules = [node.module] if node.module else []
+            # "from pkg import name" may name a submodule as well as an attribute
+            modules += [f"{node.module}.{alias.name}" if node.module else alias.name for alias in node.names]
+            for module in modules:
+                candidates.extend(_module_paths(module, bases))
+    return [path for path in candidates if path in entries and path != file_path]
+
+
+def neighbour_candidates(file_path, entries):
+    # Siblings in the same directory, files with the same extension first
+    file_dir, ext = posixpath.dirname(file_path), posixpath.splitext(file_path)[1]
+    siblings = [path for path in entries if posixpath.dirname(path) == file_dir and path != file_path]
+    siblings.sort(key=lambda path: (posixpath.splitext(path)[1] != ext, path))
+    return siblings
+
+
+# Per-session prefetch bookkeeping; fetches run on a small shared thread pool so they never hold up a rerun
+class Prefetcher:
+    def __init__(self, executor, store, byte_budget=SESSION_BYTE_BUDGET):
+        self.executor = executor
+        self.store = store
+        self.byte_budget = byte_budget
+        self.lock = threading.Lock()
+        self.prefetched = {}
+        self.used = set()
+        self.pending = set()
+        # Bytes of scheduled and finished fetches; a fetch reserves its size before it starts
+        self.bytes_reserved = 0
+        self.bytes_prefetched = 0
+        self.opens = 0
+        self.hits = 0
+
+    def schedule(self, repo, entries, sizes, source, file_path, rate_remaining):
+        # `sizes` maps blob SHA -> size; blobs of unknown size or larger than the remaining budget are skipped
+        if rate_remaining < MIN_RATE_LIMIT_REMAINING:
+            return 0
+        paths = []
+        for path in import_candidates(source, file_path, entries) + neighbour_candidates(file_path, entries):
+            if path not in paths:
+                paths.append(path)
+        scheduled = 0
+        for path in paths[:MAX_CANDIDATES]:
+            sha = entries[path]
+            size = sizes.get(sha)
+            if size is None or self.store.has_blob(sha):
+                continue
+            with self.lock:
+                if sha in self.prefetched or sha in self.pending or self.bytes_reserved + size > self.byte_budget:
+                    continue
+                self.pending.add(sha)
+                self.bytes_reserved += size
+            self.executor.submit(self._fetch, repo, sha, size)
+            scheduled += 1
+        return scheduled
+
+    def _fetch(self, repo, sha, size):
+        data = None
+        try:
+            with span("github.prefetch_blob"):
+                data = base64.b64decode(repo.get_git_blob(sha).content)
+            self.store.put_blob(sha, data)
+        except Exception:
+            # Prefetching is best effort; a failed fetch is simply a later miss
+            data = None
+        finally:
+            with self.lock:
+                self.pending.discard(sha)
+                if data is None:
+                    self.bytes_reserved -= size
+                else:
+                    self.prefetched[sha] = len(data)
+                    self.bytes_prefetched += len(data)
+
+    def record_open(self, sha):
+        with self.lock:
+            self.opens += 1
+            if sha in self.prefetched and sha not in self.used:
+                self.used.add(sha)
+                self.hits += 1
+
+    def stats(self):
+        with self.lock:
+            wasted = sum(size for sha, size in self.prefetched.items() if sha not in self.used)
+            return {
+                'opens': self.opens,
+                'hits': self.hits,
+                'hit_rate': self.hits / self.opens if self.opens else 0.0,
+                'bytes_prefetched': self.bytes_prefetched,
+                'wasted_bytes': wasted,
+            }
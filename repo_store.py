@@ -0,0 +1,144 @@
+import json
+import mmap
+import os
+import tempfile
+import threading
+
+STORE_DIR = os.environ.get("REPO_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".repo_store"))
+STORE_MAX_BYTES = int(os.environ.get("REPO_STORE_MAX_MB", "512")) * 1024 * 1024
+
+
+# Content-addressed store for git objects. Anything keyed by a git SHA is immutable,
+# so the files can be shared by every session and every worker process on the host.
+class RepoStore:
+    def __init__(self, root=STORE_DIR, max_bytes=STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.bytes_local = 0
+        self.bytes_fetched = 0
+        self.disk_bytes = None
+
+    def _path(self, kind, sha):
+        return os.path.join(self.root, kind, sha[:2], sha[2:])
+
+    def get(self, kind, sha, decode=False):
+        # With decode=True the text is decoded straight from a memory map of the file, without
+        # first copying the raw bytes into an intermediate object
+        path = self._path(kind, sha)
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    data = "" if decode else b""
+                elif decode:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                        data = str(mm, 'utf-8')
+                else:
+                    data = f.read()
+            # mtime doubles as the LRU clock, atime is unreliable on noatime mounts
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        if kind == 'blobs':
+            # Only file contents count as served locally; tree and commit metadata would inflate the figure
+            with self.lock:
+                self.bytes_local += size
+        return data
+
+    def put(self, kind, sha, data, fetched=True):
+        path = self._path(kind, sha)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file in the same directory and rename, so readers never see partial objects
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+            with self.lock:
+                if self.disk_bytes is not None:
+                    self.disk_bytes += len(data)
+        with self.lock:
+            if fetched and kind == 'blobs':
+                self.bytes_fetched += len(data)
+            over_cap = self.disk_bytes is None or self.disk_bytes > self.max_bytes
+        if over_cap:
+            self.gc()
+
+    def has_blob(self, sha):
+        return os.path.exists(self._path('blobs', sha))
+
+    def get_blob(self, sha):
+        return self.get('blobs', sha)
+
+    def get_blob_text(self, sha):
+        # Raises UnicodeDecodeError for binary blobs, like bytes.decode would
+        return self.get('blobs', sha, decode=True)
+
+    def put_blob(self, sha, data, fetched=True):
+        self.put('blobs', sha, data, fetched)
+
+    def get_tree(self, sha):
+        data = self.get('trees', sha)
+        return json.loads(data) if data is not None else None
+
+    def put_tree(self, sha, entries):
+        self.put('trees', sha, json.dumps(entries, separators=(',', ':')).encode())
+
+    def get_tree_sizes(self, sha):
+        data = self.get('sizes', sha)
+        return json.loads(data) if data is not None else None
+
+    def put_tree_sizes(self, sha, sizes):
+        # Blob SHA -> size for one tree, so callers can budget a fetch before starting it
+        self.put('sizes', sha, json.dumps(sizes, separators=(',', ':')).encode(), fetched=False)
+
+    def get_commit_tree(self, commit_sha):
+        data = self.get('commits', commit_sha)
+        return data.decode() if data is not None else None
+
+    def put_commit_tree(self, commit_sha, tree_sha):
+        self.put('commits', commit_sha, tree_sha.encode())
+
+    def get_snapshot(self, commit_sha):
+        data = self.get('snapshots', commit_sha)
+        return json.loads(data) if data is not None else None
+
+    def put_snapshot(self, commit_sha, snapshot):
+        self.put('snapshots', commit_sha, json.dumps(snapshot, separators=(',', ':')).encode(), fetched=False)
+
+    def gc(self):
+        # Evict least recently used objects until the store is back under 80% of its cap
+        files = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total > self.max_bytes:
+            files.sort()
+            target = self.max_bytes * 0.8
+            for _, size, path in files:
+                if total <= target:
+                    break
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+        with self.lock:
+            self.disk_bytes = total
+
+    def stats(self):
+        with self.lock:
+            return {'bytes_local': self.bytes_local, 'bytes_fetched': self.bytes_fetched, 'disk_bytes': self.disk_bytes or 0}
@@ -0,0 +1,114 @@
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows has no flock; msvcrt byte-range locks serve the same purpose
+    fcntl = None
+    import msvcrt
+
+REGISTRY_PATH = os.environ.get("SANDBOX_REGISTRY", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".sandbox_slots.json"))
+SLOT_CAP = int(os.environ.get("SANDBOX_SLOTS", "8"))
+IDLE_SECONDS = int(os.environ.get("SANDBOX_IDLE_SECONDS", str(30 * 60)))
+
+
+def slot_path(slot):
+    return f"pages/sandbox_{slot}.py"
+
+
+def slot_page(slot):
+    return f"sandbox_{slot}"
+
+
+def _lock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK itself retries for about ten seconds before giving up
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock(f):
+    if fcntl is not None:
+        fcntl.flock(f, fcntl.LOCK_UN)
+        return
+    f.seek(0)
+    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def _registry(path=REGISTRY_PATH):
+    # The registry is shared by all worker processes; an exclusive lock serializes every read-modify-write
+    with open(path + '.lock', 'a+') as lock:
+        _lock(lock)
+        try:
+            try:
+                with open(path) as f:
+                    slots = json.load(f)
+            except (FileNotFoundError, ValueError):
+                slots = {}
+            yield slots
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(slots, f)
+            os.replace(tmp_path, path)
+        finally:
+            _unlock(lock)
+
+
+def lease_slot(session_id, cap=SLOT_CAP, path=REGISTRY_PATH):
+    # Returns the session's slot or a free one; None when all are busy. Idle leases are freed by expire_slots.
+    now = time.time()
+    with _registry(path) as slots:
+        for slot, lease in slots.items():
+            if lease['session'] == session_id:
+                lease['last_used'] = now
+                return int(slot)
+        free = [slot for slot in range(cap) if str(slot) not in slots]
+        if not free:
+            return None
+        slots[str(free[0])] = {'session': session_id, 'leased': now, 'last_used': now, 'last_run': None, 'files': []}
+        return free[0]
+
+
+def record_run(session_id, slot, repo, branch, path=REGISTRY_PATH):
+    # Remembers where the slot's page was committed so it can be removed when the lease ends
+    now = time.time()
+    with _registry(path) as slots:
+        lease = slots.get(str(slot))
+        if lease and lease['session'] == session_id:
+            lease['last_used'] = now
+            lease['last_run'] = now
+            files = lease.setdefault('files', [])
+            if [repo, branch] not in files:
+                files.append([repo, branch])
+
+
+def release_slot(session_id, path=REGISTRY_PATH):
+    # Returns {slot: lease} for the released leases; their committed pages are the caller's to remove
+    with _registry(path) as slots:
+        released = {int(slot): slots.pop(slot) for slot in [slot for slot, lease in slots.items() if lease['session'] == session_id]}
+    return released
+
+
+def expire_slots(idle_seconds=IDLE_SECONDS, path=REGISTRY_PATH):
+    # Frees leases idle past the timeout, e.g. sessions closed without logging out; returns them like release_slot
+    now = time.time()
+    with _registry(path) as slots:
+        expired = {int(slot): slots.pop(slot) for slot in [slot for slot, lease in slots.items() if now - lease['last_used'] > idle_seconds]}
+    return expired
+
+
+def list_slots(path=REGISTRY_PATH):
+    with _registry(path) as slots:
+        return {int(slot): dict(lease) for slot, lease in slots.items()}
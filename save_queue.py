@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from github import Github, GithubException
+
+from github_ops import commit_files, is_not_fast_forward, StaleBaseError
+from tracing import span
+
+JOURNAL_PATH = os.environ.get("SAVE_JOURNAL", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".save_journal.sqlite3"))
+COALESCE_SECONDS = int(os.environ.get("SAVE_COALESCE_SECONDS", "30"))
+# Under a steady stream of saves the debounce would never fire; flush anyway after this long
+MAX_DELAY_SECONDS = COALESCE_SECONDS * 5
+STALE_CLAIM_SECONDS = 600
+MAX_BACKOFF_SECONDS = 300
+MAX_ATTEMPTS = int(os.environ.get("SAVE_MAX_ATTEMPTS", "8"))
+# A missing branch or a rejected tree will not fix itself by retrying; a lost fast-forward race will
+PERMANENT_STATUS = (404, 422)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS saves (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    path TEXT NOT NULL,
+    content TEXT NOT NULL,
+    message TEXT NOT NULL,
+    session TEXT,
+    created REAL NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    claimed REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL DEFAULT 0,
+    commit_sha TEXT,
+    error TEXT,
+    base TEXT
+);
+CREATE INDEX IF NOT EXISTS saves_state ON saves (state, repo, branch);
+"""
+
+
+# Durable journal of editor saves. Rows go pending -> flushing -> flushed (or failed once retrying
+# is pointless); a flush always takes every pending row of one (repo, branch) up to a fixed id, so
+# saves commit in order.
+class SaveJournal:
+    def __init__(self, path=JOURNAL_PATH):
+        self.path = path
+        with self._transaction() as conn:
+            conn.executescript(SCHEMA)
+            # Journals written before saves recorded their base blob
+            if 'base' not in {row[1] for row in conn.execute("PRAGMA table_info(saves)")}:
+                conn.execute("ALTER TABLE saves ADD COLUMN base TEXT")
+
+    def _connect(self):
+        # WAL lets the UI read status while the flusher writes; FULL syncs every commit so an acknowledged save survives a crash
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, repo, branch, path, content, message, session, base=None):
+        # `base` is the blob SHA the edit started from; the flush refuses to overwrite a path that moved on since
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO saves (repo, branch, path, content, message, session, created, base) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (repo, branch, path, content, message, session, time.time(), base))
+            return cursor.lastrowid
+
+    def claim_due(self, now, window=COALESCE_SECONDS):
+        # Atomically moves the rows of one due (repo, branch) to 'flushing'; several processes may run flushers
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("UPDATE saves SET state = 'pending', claimed = NULL WHERE state = 'flushing' AND claimed < ?", (now - STALE_CLAIM_SECONDS,))
+            group = conn.execute(
+                "SELECT repo, branch, MAX(id) FROM saves WHERE state = 'pending' GROUP BY repo, branch "
+                "HAVING (MAX(created) <= ? OR MIN(created) <= ?) AND MAX(next_attempt) <= ? ORDER BY MIN(id) LIMIT 1",
+                (now - window, now - MAX_DELAY_SECONDS, now)).fetchone()
+            if group is None:
+                conn.execute("COMMIT")
+                return None
+            repo, branch, max_id = group
+            conn.execute("UPDATE saves SET state = 'flushing', claimed = ? WHERE state = 'pending' AND repo = ? AND branch = ? AND id <= ?",
+                (now, repo, branch, max_id))
+            rows = conn.execute("SELECT id, path, content, message, base FROM saves WHERE state = 'flushing' AND repo = ? AND branch = ? AND id <= ? ORDER BY id",
+                (repo, branch, max_id)).fetchall()
+            conn.execute("COMMIT")
+            return repo, branch, max_id, rows
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def mark_flushed(self, repo, branch, max_id, commit_sha):
+        with self._transaction() as conn:
+            conn.execute("UPDATE saves SET state = 'flushed', commit_sha = ?, error = NULL WHERE state = 'flushing' AND repo = ? AND branch = ? AND id <= ?",
+                (commit_sha, repo, branch, max_id))
+
+    def mark_failed(self, repo, branch, max_id, error, permanent=False):
+        with self._transaction() as conn:
+            attempts = conn.execute("SELECT MAX(attempts) FROM saves WHERE state = 'flushing' AND repo = ? AND branch = ? AND id <= ?",
+                (repo, branch, max_id)).fetchone()[0] or 0
+            state = 'failed' if permanent or attempts + 1 >= MAX_ATTEMPTS else 'pending'
+            delay = min(MAX_BACKOFF_SECONDS, 2 ** attempts)
+            conn.execute("UPDATE saves SET state = ?, claimed = NULL, attempts = attempts + 1, next_attempt = ?, error = ? "
+                "WHERE state = 'flushing' AND repo = ? AND branch = ? AND id <= ?",
+                (state, time.time() + delay, error, repo, branch, max_id))
+
+    def has_pending(self):
+        with self._transaction() as conn:
+            return conn.execute("SELECT 1 FROM saves WHERE state IN ('pending', 'flushing') LIMIT 1").fetchone() is not None
+
+    def status(self, session):
+        with self._transaction() as conn:
+            pending = conn.execute("SELECT path, COUNT(*), MAX(error) FROM saves WHERE session = ? AND state IN ('pending', 'flushing') GROUP BY path ORDER BY path",
+                (session,)).fetchall()
+            failed = conn.execute("SELECT path, COUNT(*), MAX(error) FROM saves WHERE session = ? AND state = 'failed' GROUP BY path ORDER BY path",
+                (session,)).fetchall()
+            flushed, commits = conn.execute("SELECT COUNT(*), COUNT(DISTINCT commit_sha) FROM saves WHERE session = ? AND state = 'flushed'",
+                (session,)).fetchone()
+        return {'pending': pending, 'failed': failed, 'flushed': flushed, 'commits': commits, 'commits_saved': flushed - commits}
+
+    def commit_shas(self, session):
+        with self._transaction() as conn:
+            return {row[0] for row in conn.execute("SELECT DISTINCT commit_sha FROM saves WHERE session = ? AND state = 'flushed'", (session,))}
+
+
+def coalesced_message(rows):
+    messages = []
+    for _, _, _, message, _ in rows:
+        if message and message not in messages:
+            messages.append(message)
+    if len(rows) == 1 or len(messages) == 1:
+        return messages[0] if messages else "Update files"
+    paths = sorted({path for _, path, _, _, _ in rows})
+    return f"Update {len(paths)} file(s) ({len(rows)} saves coalesced)\n\n" + "\n".join(f"- {message}" for message in messages)
+
+
+# Background thread that turns due journal groups into one commit each
+class SaveFlusher(threading.Thread):
+    def __init__(self, journal, token, interval=1.0):
+        super().__init__(daemon=True, name='save-flusher')
+        self.journal = journal
+        self.github = Github(token)
+        self.interval = interval
+
+    def run(self):
+        while True:
+            try:
+                while self.flush_one():
+                    pass
+            except Exception:
+                # A broken journal read must not kill the thread; the next tick tries again
+                pass
+            time.sleep(self.interval)
+
+    def flush_one(self):
+        claimed = self.journal.claim_due(time.time())
+        if claimed is None:
+            return False
+        repo_name, branch, max_id, rows = claimed
+        # Later saves of a path replace earlier ones; rows are in id order. The first save of a path
+        # in the group carries the base: the later ones were edited on top of it, not of the branch.
+        files = {path: content for _, path, content, _, _ in rows}
+        base = {}
+        for _, path, _, _, row_base in rows:
+            if path not in base:
+                base[path] = row_base
+        base = {path: sha for path, sha in base.items() if sha is not None}
+        try:
+            with span("github.flush_saves", files=len(files), saves=len(rows)):
+                commit = commit_files(self.github.get_repo(repo_name), branch, files, coalesced_message(rows), base=base)
+        except Exception as e:
+            permanent = isinstance(e, StaleBaseError) or (
+                isinstance(e, GithubException) and e.status in PERMANENT_STATUS and not is_not_fast_forward(e))
+            self.journal.mark_failed(repo_name, branch, max_id, str(e), permanent)
+            return True
+        self.journal.mark_flushed(repo_name, branch, max_id, commit.sha)
+        return True
@@ -0,0 +1,48 @@
+import hashlib
+import tarfile
+import time
+
+import requests
+
+MAX_SNAPSHOT_BYTES = 200 * 1024 * 1024
+MAX_FILE_BYTES = 2 * 1024 * 1024
+BINARY_SNIFF_BYTES = 8000
+DOWNLOAD_TIMEOUT = 60
+
+
+def git_blob_sha(data):
+    # Same id git gives the blob, so snapshot files land in the store under their tree SHAs
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def is_binary(data):
+    return b"\0" in data[:BINARY_SNIFF_BYTES]
+
+
+def load_snapshot(url, store, max_bytes=MAX_SNAPSHOT_BYTES, max_file_bytes=MAX_FILE_BYTES):
+    # Streams the tarball straight through tarfile; only one member is held in memory at a time,
+    # so the largest member read is what the download buffers at its peak
+    started = time.perf_counter()
+    stats = {'files': 0, 'bytes': 0, 'skipped_binary': 0, 'skipped_large': 0, 'truncated': False, 'peak_buffered': 0}
+    with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+        response.raise_for_status()
+        with tarfile.open(fileobj=response.raw, mode='r|gz') as tar:
+            for member in tar:
+                if not member.isfile() or '/' not in member.name:
+                    continue
+                if member.size > max_file_bytes:
+                    stats['skipped_large'] += 1
+                    continue
+                if stats['bytes'] + member.size > max_bytes:
+                    stats['truncated'] = True
+                    break
+                data = tar.extractfile(member).read()
+                stats['peak_buffered'] = max(stats['peak_buffered'], len(data))
+                if is_binary(data):
+                    stats['skipped_binary'] += 1
+                    continue
+                store.put_blob(git_blob_sha(data), data)
+                stats['files'] += 1
+                stats['bytes'] += len(data)
+    stats['seconds'] = time.perf_counter() - started
+    return stats
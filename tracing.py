@@ -0,0 +1,207 @@
+import contextvars
+import cProfile
+import functools
+import glob
+import io
+import json
+import logging
+import os
+import pstats
+import secrets
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+TRACE_DIR = os.environ.get("TRACE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".traces"))
+TRACE_FILE_BYTES = 10 * 1024 * 1024
+TRACE_FILE_BACKUPS = 3
+# Rotation only bounds each process; restarts and extra workers leave their files behind
+TRACE_DIR_MAX_BYTES = int(os.environ.get("TRACE_DIR_MAX_MB", "100")) * 1024 * 1024
+
+# Streamlit stops and restarts scripts by raising these; they are not failures
+CONTROL_FLOW_EXCEPTIONS = ("RerunException", "StopException")
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_logger = None
+
+
+def _trace_files():
+    # Newest first
+    return sorted(glob.glob(os.path.join(TRACE_DIR, "spans-*.jsonl*")), key=os.path.getmtime, reverse=True)
+
+
+def prune_traces(max_bytes=TRACE_DIR_MAX_BYTES):
+    # Deletes the oldest span files once the directory is over the cap; this process's own files are kept
+    own = f"spans-{os.getpid()}.jsonl"
+    total = 0
+    for path in _trace_files():
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            continue
+        total += size
+        if total > max_bytes and not os.path.basename(path).startswith(own):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def _get_logger():
+    # One rotating JSONL file per process, so concurrent workers never rotate each other's files
+    global _logger
+    if _logger is None:
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        prune_traces()
+        logger = logging.getLogger(f"{__name__}.spans")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        handler = RotatingFileHandler(os.path.join(TRACE_DIR, f"spans-{os.getpid()}.jsonl"), maxBytes=TRACE_FILE_BYTES, backupCount=TRACE_FILE_BACKUPS)
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        _logger = logger
+    return _logger
+
+
+@contextmanager
+def span(name, **attributes):
+    # Records one OTLP-shaped span; nested spans share the trace id of the outermost one
+    parent = _current_span.get()
+    record = {
+        'traceId': parent['traceId'] if parent else secrets.token_hex(16),
+        'spanId': secrets.token_hex(8),
+        'parentSpanId': parent['spanId'] if parent else None,
+        'name': name,
+        'startTimeUnixNano': time.time_ns(),
+        'attributes': dict(attributes),
+        'status': {'code': 'OK'},
+    }
+    record['root'] = parent['root'] if parent else record
+    token = _current_span.set(record)
+    try:
+        yield record
+    except BaseException as e:
+        if type(e).__name__ not in CONTROL_FLOW_EXCEPTIONS:
+            record['status'] = {'code': 'ERROR', 'message': str(e)}
+        raise
+    finally:
+        _current_span.reset(token)
+        record['endTimeUnixNano'] = time.time_ns()
+        record.pop('root')
+        try:
+            _get_logger().info(json.dumps(record, default=str))
+        except OSError:
+            pass
+
+
+def traced(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def set_action(action):
+    # Tags the current trace's root span with the user action that triggered it
+    current = _current_span.get()
+    if current is not None:
+        current['root']['attributes']['action'] = action
+
+
+def profile_call(fn, engine, on_report):
+    # Profiles a single call; the report is delivered even when the call ends in a rerun
+    if engine == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            engine = 'cProfile'
+    if engine == 'pyinstrument':
+        profiler = Profiler()
+        profiler.start()
+        try:
+            return fn()
+        finally:
+            profiler.stop()
+            on_report(profiler.output_text(unicode=True))
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return fn()
+    finally:
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(40)
+        on_report(out.getvalue())
+
+
+def read_spans(limit=50000):
+    # The newest `limit` spans in chronological order; older files are not even opened once enough are read
+    spans = []
+    for path in _trace_files():
+        try:
+            with open(path) as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            continue
+        for line in reversed(lines):
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+            if len(spans) >= limit:
+                return spans[::-1]
+    return spans[::-1]
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def latency_summary(spans):
+    durations = {}
+    errors = {}
+    for record in spans:
+        ms = (record['endTimeUnixNano'] - record['startTimeUnixNano']) / 1e6
+        durations.setdefault(record['name'], []).append(ms)
+        if record['status']['code'] == 'ERROR':
+            errors[record['name']] = errors.get(record['name'], 0) + 1
+    rows = []
+    for name, values in sorted(durations.items()):
+        values.sort()
+        rows.append({
+            'span': name,
+            'count': len(values),
+            'errors': errors.get(name, 0),
+            'p50 ms': round(percentile(values, 50), 1),
+            'p95 ms': round(percentile(values, 95), 1),
+            'p99 ms': round(percentile(values, 99), 1),
+        })
+    return rows
+
+
+def action_counts(spans):
+    # Average number of each span per trace, grouped by the action recorded on the trace's root span
+    root_actions = {}
+    for record in spans:
+        if record['parentSpanId'] is None:
+            root_actions[record['traceId']] = record['attributes'].get('action') or record['name']
+    traces = {}
+    for trace_id, action in root_actions.items():
+        traces[action] = traces.get(action, 0) + 1
+    counts = {}
+    for record in spans:
+        if record['parentSpanId'] is None and record['name'] == 'rerun':
+            continue
+        action = root_actions.get(record['traceId'], 'unknown')
+        counts[(action, record['name'])] = counts.get((action, record['name']), 0) + 1
+    return [
+        {'action': action, 'span': name, 'calls': calls, 'calls per action': round(calls / traces.get(action, 1), 2)}
+        for (action, name), calls in sorted(counts.items())
+    ]
@@ -0,0 +1,50 @@
+import re
+
+WINDOW_THRESHOLD_BYTES = 512 * 1024
+WINDOW_LINES = 400
+
+SYMBOL_RE = re.compile(r"^\s*(?:async\s+def|def|class)\s+(\w+)")
+
+
+# A large file edited one window of lines at a time. Edits splice the line list in place
+# and the whole file is only joined back into one string when it is needed.
+class WindowedBuffer:
+    def __init__(self, text):
+        self.source = text
+        self.lines = text.splitlines(keepends=True)
+        self.pending = 0
+        self.edits = 0
+        self._symbols = None
+
+    def __len__(self):
+        return len(self.lines)
+
+    def window(self, start, size=WINDOW_LINES):
+        start = max(0, min(start, max(len(self.lines) - 1, 0)))
+        end = min(len(self.lines), start + size)
+        return start, end, ''.join(self.lines[start:end])
+
+    def apply(self, start, end, text):
+        new_lines = text.splitlines(keepends=True)
+        # Editors drop the final newline; keep the window from running into the next line
+        if new_lines and end < len(self.lines) and not new_lines[-1].endswith('\n'):
+            new_lines[-1] += '\n'
+        if new_lines == self.lines[start:end]:
+            return False
+        self.lines[start:end] = new_lines
+        self.pending += 1
+        self.edits += 1
+        self._symbols = None
+        return True
+
+    def text(self):
+        # Reassembles the full file; the result becomes the new source so callers can tell it is current
+        if self.pending:
+            self.source = ''.join(self.lines)
+            self.pending = 0
+        return self.source
+
+    def symbols(self):
+        if self._symbols is None:
+            self._symbols = [(number, match.group(1)) for number, line in enumerate(self.lines) if (match := SYMBOL_RE.match(line))]
+        return self._symbols